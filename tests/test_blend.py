@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from watermark_engine import (AreaPlan, RegionPlan, alpha_to_fixed_point, blend_area,
+                              blend_regions, ALPHA_ONE)
+
+
+def float_blend(dst, src, weights):
+    weights = weights[:, :, np.newaxis]
+    return (src * weights + dst * (1 - weights)).astype(np.uint8)
+
+
+def weight_plan(weights):
+    alpha = alpha_to_fixed_point(weights)
+    core, strips = blend_regions(alpha)
+    return AreaPlan(area=None, outer=None, inner=None, mask=None, alpha=alpha,
+                    inv_alpha=ALPHA_ONE - alpha, core=core, strips=strips, reflect=None, key=None)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_blend_matches_float_reference_on_random_weights(seed):
+    rng = np.random.default_rng(seed)
+    height, width = rng.integers(8, 80, 2)
+    weights = rng.random((height, width), dtype=np.float32)
+    # Opaque core and untouched border, as feathered areas have
+    weights[2:-2, 3:-3][height // 4:height // 2, width // 4:width // 2] = 1
+    weights[0] = 0
+    dst = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    src = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+    expected = float_blend(dst.astype(np.float32), src.astype(np.float32), weights)
+    blend_area(dst, src, weight_plan(weights))
+    assert np.abs(dst.astype(int) - expected).max() <= 1
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_blend_matches_float_reference_on_planned_areas(seed):
+    rng = np.random.default_rng(seed)
+    frame_shape = (120, 160, 3)
+    x, y = rng.integers(0, 120), rng.integers(0, 80)
+    w, h = rng.integers(4, 60, 2)
+    plan = RegionPlan(frame_shape, [(x, y, w, h)], 12)
+    area_plan = plan.areas[0]
+    weights = area_plan.alpha[:, :, 0].astype(np.float32) / ALPHA_ONE
+    frame = rng.integers(0, 256, frame_shape, dtype=np.uint8)
+    dst = frame[area_plan.outer]
+    src = rng.integers(0, 256, dst.shape, dtype=np.uint8)
+
+    expected = float_blend(dst.astype(np.float32), src.astype(np.float32), weights)
+    blend_area(dst, src, area_plan)
+    assert np.abs(frame[area_plan.outer].astype(int) - expected).max() <= 1
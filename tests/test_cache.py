@@ -0,0 +1,27 @@
+import numpy as np
+
+from watermark_cache import InpaintCache
+from watermark_engine import ProcessingConfig, RegionPlan, remove_watermark_advanced
+
+
+def test_near_duplicate_hit_keeps_margin_content():
+    config = ProcessingConfig.from_settings({"inpaint_method": "telea", "margin_size": 20})
+    rng = np.random.default_rng(1)
+    first = np.full((200, 200, 3), 90, dtype=np.uint8)
+    first += rng.integers(0, 3, first.shape, dtype=np.uint8)
+    first[95:105, 85:115] = 230
+    plan = RegionPlan(first.shape, [(80, 80, 40, 40)], config.margin_size)
+    area_plan = plan.areas[0]
+    cache = InpaintCache(tolerance=2.0)
+    remove_watermark_advanced(first.copy(), plan, config, cache)
+
+    # Bright object moves into the margin, where the blend leaves pixels untouched
+    second = first.copy()
+    second[61:65, 61:65] = 255
+    assert not area_plan.alpha[1:5, 1:5].any()
+    result = remove_watermark_advanced(second.copy(), plan, config, cache)
+
+    assert cache.stats()[0] == 1
+    assert (result[61:65, 61:65] == 255).all()
+    untouched = area_plan.alpha[:, :, 0] == 0
+    assert (result[area_plan.outer][untouched] == second[area_plan.outer][untouched]).all()
@@ -0,0 +1,53 @@
+import cv2
+import numpy as np
+
+from watermark_engine import (COLOR_SAMPLE_INTERVAL, ProcessingConfig, RegionPlan, SceneAnalyzer,
+                              apply_color_correction, curve_to_lut, equalization_curve,
+                              luma_histogram)
+
+
+def colour_frame():
+    """Saturated colour gradients over a dark-to-mid lightness range"""
+    frame = np.zeros((240, 320, 3), dtype=np.uint8)
+    frame[:, :, 0] = np.linspace(0, 255, 320)[None, :]
+    frame[:, :, 1] = np.linspace(40, 200, 240)[:, None]
+    frame[:, :, 2] = 120
+    return frame
+
+
+def test_color_correction_maps_luma_and_keeps_hue_and_saturation():
+    frame = colour_frame()
+    lut = curve_to_lut(equalization_curve(luma_histogram(frame, step=1)))
+    result = apply_color_correction(frame.copy(), lut)
+
+    before = cv2.cvtColor(frame, cv2.COLOR_BGR2YCrCb).astype(int)
+    after = cv2.cvtColor(result, cv2.COLOR_BGR2YCrCb).astype(int)
+    target = lut[before[:, :, 0]].astype(int)
+    # Saturated colours clip at the ends of the luma range
+    mid = (target > 32) & (target < 224)
+    assert np.abs(after[:, :, 0] - target)[mid].mean() < 1
+    assert np.abs(after[:, :, 1:] - before[:, :, 1:]).mean() < 3
+
+    hsv_before = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV).astype(int)
+    hsv_after = cv2.cvtColor(result, cv2.COLOR_BGR2HSV).astype(int)
+    assert abs(hsv_after[:, :, 1].mean() - hsv_before[:, :, 1].mean()) < 8
+    hue_diff = np.abs(hsv_after[:, :, 0] - hsv_before[:, :, 0])
+    assert np.minimum(hue_diff, 180 - hue_diff).mean() < 3
+
+
+def scene_luts(scene_threshold, frames):
+    config = ProcessingConfig.from_settings({"color_correction": True,
+                                             "scene_threshold": scene_threshold})
+    analyzer = SceneAnalyzer(RegionPlan(frames[0].shape, [(10, 10, 40, 30)], 10), config)
+    return [analyzer(index, frame)[0].lut for index, frame in enumerate(frames)]
+
+
+def test_without_scene_detection_the_curve_is_built_once():
+    # Slowly brightening frames: no cut, but the curve would follow them
+    frames = [np.clip(colour_frame().astype(int) + i, 0, 255).astype(np.uint8)
+              for i in range(3 * COLOR_SAMPLE_INTERVAL)]
+    luts = scene_luts(0, frames)
+    assert all(lut is luts[0] for lut in luts)
+
+    luts = scene_luts(0.3, frames)
+    assert any(not np.array_equal(lut, luts[0]) for lut in luts)
@@ -0,0 +1,31 @@
+import numpy as np
+
+from watermark_engine import ProcessingConfig, RegionPlan, TemporalDenoiser
+
+
+def noisy_frames(count=5, shape=(120, 160, 3)):
+    rng = np.random.default_rng(2)
+    return [rng.integers(60, 200, shape, dtype=np.uint8) for _ in range(count)]
+
+
+def denoise_config():
+    return ProcessingConfig.from_settings({"denoise": True, "denoise_frames": 3,
+                                           "denoise_scope": "areas", "margin_size": 10})
+
+
+def test_temporal_denoiser_uses_each_frames_plan():
+    config = denoise_config()
+    frames = noisy_frames()
+    plan = RegionPlan(frames[0].shape, [(10, 10, 30, 30)], config.margin_size)
+    moved = plan.moved(((80, 50),))
+    written = []
+    denoiser = TemporalDenoiser(written.append, plan, config)
+    for frame in frames:
+        denoiser.push(frame, moved)
+    denoiser.flush()
+
+    assert len(written) == len(frames)
+    for source, result in zip(frames, written):
+        # Where the logo started is left alone, where it is now is denoised
+        assert (result[plan.areas[0].outer] == source[plan.areas[0].outer]).all()
+        assert (result[moved.areas[0].outer] != source[moved.areas[0].outer]).any()
@@ -0,0 +1,31 @@
+import cv2
+import numpy as np
+
+from watermark_detect import detect_watermarks
+
+
+def letterboxed_frames(count=40, logo=False):
+    """Moving content between black bars, optionally with a static text logo"""
+    rng = np.random.default_rng(4)
+    frames = []
+    for _ in range(count):
+        noise = rng.integers(0, 256, (45, 80, 3), dtype=np.uint8)
+        frame = cv2.resize(noise, (640, 360), interpolation=cv2.INTER_CUBIC)
+        frame[:45] = 0
+        frame[-45:] = 0
+        if logo:
+            cv2.putText(frame, "LOGO", (480, 290), cv2.FONT_HERSHEY_DUPLEX, 1, (255, 255, 255), 2)
+        frames.append(frame)
+    return frames
+
+
+def test_letterbox_bars_are_not_watermarks():
+    assert detect_watermarks(letterboxed_frames()) == ([], None)
+
+
+def test_logo_inside_letterboxed_video_is_found():
+    boxes, mask = detect_watermarks(letterboxed_frames(logo=True))
+    assert len(boxes) == 1
+    x, y, w, h = boxes[0]
+    assert x <= 480 and y <= 265 and x + w >= 560 and y + h >= 290
+    assert not mask[:50].any() and not mask[-50:].any()
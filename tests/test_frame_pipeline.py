@@ -0,0 +1,144 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from watermark_pipeline import FramePipeline, ThreadWorkers
+
+COUNT = 24
+
+
+def frame_source(count=COUNT):
+    """read_frame() returning frames filled with their index, then None"""
+    frames = iter([np.full((4, 4, 3), i, dtype=np.uint8) for i in range(count)])
+    return lambda: next(frames, None)
+
+
+def run_pipeline(func, window=4, write_frame=None, **kwargs):
+    written = []
+    if write_frame is None:
+        def write_frame(index, frame):
+            written.append((index, int(frame[0, 0, 0])))
+    workers = ThreadWorkers(func, max_workers=4)
+    try:
+        count = FramePipeline(frame_source(), workers, write_frame, window, **kwargs).run()
+    finally:
+        workers.close()
+    return count, written
+
+
+def add_one(frame):
+    return frame + 1
+
+
+def test_frames_are_written_in_order_when_workers_finish_out_of_order():
+    def late_first(frame):
+        # Earlier frames take longer, so later ones finish first
+        time.sleep((COUNT - int(frame[0, 0, 0])) * 0.002)
+        return frame + 1
+
+    count, written = run_pipeline(late_first)
+    assert count == COUNT
+    assert written == [(i, i + 1) for i in range(COUNT)]
+
+
+def test_worker_error_stops_the_run():
+    def fail_on_five(frame):
+        if frame[0, 0, 0] == 5:
+            raise RuntimeError("worker failed")
+        return frame
+
+    with pytest.raises(RuntimeError, match="worker failed"):
+        run_pipeline(fail_on_five)
+
+
+def test_write_error_stops_the_run():
+    reads = []
+    source = frame_source()
+
+    def read_frame():
+        reads.append(1)
+        return source()
+
+    def write_frame(index, frame):
+        if index == 3:
+            raise OSError("disk full")
+
+    workers = ThreadWorkers(add_one)
+    pipeline = FramePipeline(read_frame, workers, write_frame, window=4)
+    try:
+        with pytest.raises(OSError, match="disk full"):
+            pipeline.run()
+    finally:
+        workers.close()
+    assert pipeline.frames_written == 3
+    # Reading stops soon after the error instead of decoding the whole input
+    assert len(reads) < COUNT
+
+
+class CountingWorkers(ThreadWorkers):
+    """ThreadWorkers that track frames between submit and write"""
+
+    def __init__(self, func):
+        super().__init__(func)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+
+    def submit(self, index, frame, *frame_args):
+        with self.lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        return super().submit(index, frame, *frame_args)
+
+    def written(self):
+        with self.lock:
+            self.in_flight -= 1
+
+
+def test_in_flight_frames_stay_within_window():
+    def slow(frame):
+        time.sleep(0.005)
+        return frame
+
+    workers = CountingWorkers(slow)
+    try:
+        count = FramePipeline(frame_source(), workers, lambda index, frame: workers.written(),
+                              window=3).run()
+    finally:
+        workers.close()
+    assert count == COUNT
+    assert workers.peak == 3
+
+
+def test_cancellation_stops_reading():
+    reads = []
+    source = frame_source()
+
+    def read_frame():
+        reads.append(1)
+        return source()
+
+    workers = ThreadWorkers(add_one)
+    try:
+        count = FramePipeline(read_frame, workers, lambda index, frame: None, window=4,
+                              is_cancelled=lambda: len(reads) >= 5).run()
+    finally:
+        workers.close()
+    assert count == 5
+    assert len(reads) == 5
+
+
+def test_frames_without_args_pass_through_unprocessed():
+    processed = []
+
+    def record(frame):
+        processed.append(int(frame[0, 0, 0]))
+        return frame + 1
+
+    count, written = run_pipeline(
+        record, frame_args=lambda index, frame: () if index % 2 == 0 else None)
+    assert count == COUNT
+    assert written == [(i, i + 1 if i % 2 == 0 else i) for i in range(COUNT)]
+    assert sorted(processed) == list(range(0, COUNT, 2))
@@ -0,0 +1,40 @@
+import subprocess
+
+import cv2
+import numpy as np
+import pytest
+
+import watermark_io
+from watermark_io import FFmpegWriter, OpenCVWriter, ffmpeg_available
+
+
+def test_failed_mux_keeps_video(tmp_path, monkeypatch):
+    def fail(video_path, source_path, output_path):
+        raise Exception("ffmpeg failed (1): broken audio")
+
+    monkeypatch.setattr(watermark_io, "mux_streams", fail)
+    output = tmp_path / "out.mp4"
+    writer = OpenCVWriter(str(output), "mp4v", 25, (64, 48), source_path=str(tmp_path / "in.mp4"))
+    for _ in range(5):
+        writer.write(np.zeros((48, 64, 3), dtype=np.uint8))
+    writer.release()
+
+    assert output.stat().st_size > 0
+    assert [path.name for path in tmp_path.iterdir()] == ["out.mp4"]
+
+
+@pytest.mark.skipif(not ffmpeg_available(), reason="needs ffmpeg")
+def test_ffmpeg_writer_drops_streams_the_container_cannot_hold(tmp_path):
+    # Opus audio cannot be stored in MOV
+    source = tmp_path / "in.mkv"
+    subprocess.run(["ffmpeg", "-loglevel", "error", "-f", "lavfi", "-i", "testsrc=size=64x48:duration=1",
+                    "-f", "lavfi", "-i", "sine=duration=1", "-c:v", "mpeg4", "-c:a", "libopus",
+                    str(source)], check=True)
+    output = tmp_path / "out.mov"
+    writer = FFmpegWriter(str(output), "mp4v", 25, (64, 48), source_path=str(source))
+    for _ in range(30):
+        writer.write(np.zeros((48, 64, 3), dtype=np.uint8))
+    writer.release()
+
+    assert int(cv2.VideoCapture(str(output)).get(cv2.CAP_PROP_FRAME_COUNT)) == 30
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["in.mkv", "out.mov"]
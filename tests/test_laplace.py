@@ -0,0 +1,22 @@
+import cv2
+import numpy as np
+
+from watermark_laplace import laplace_fill
+
+
+def test_circular_mask_recovers_linear_ramp():
+    # A linear ramp is harmonic, the fill of any mask must reproduce it
+    yy, xx = np.mgrid[:160, :160].astype(np.float32)
+    ramp = xx * 1.2 + yy * 0.4
+    image = np.repeat(np.rint(ramp)[:, :, np.newaxis], 3, axis=2).astype(np.uint8)
+    mask = np.zeros((160, 160), dtype=np.uint8)
+    cv2.circle(mask, (80, 80), 60, 255, -1)
+    damaged = image.copy()
+    damaged[mask > 0] = 255
+
+    result = laplace_fill(damaged, mask)
+
+    error = np.abs(result[mask > 0].astype(np.float32) - image[mask > 0])
+    assert error.mean() < 0.5
+    assert error.max() <= 2
+    assert (result[mask == 0] == image[mask == 0]).all()
@@ -0,0 +1,33 @@
+import numpy as np
+
+from watermark_engine import RegionPlan, coalesce_areas
+
+FRAME = (360, 640)
+MARGIN = 20
+
+
+def frame_weights(plan):
+    """Blend weights of all areas of plan in frame coordinates"""
+    weights = np.zeros(FRAME, dtype=np.int32)
+    for area_plan in plan.areas:
+        np.maximum(weights[area_plan.outer], area_plan.alpha[:, :, 0], out=weights[area_plan.outer])
+    return weights
+
+
+def test_merged_area_keeps_feathered_edges():
+    first, second = (300, 100, 80, 60), (350, 120, 80, 60)
+    areas, masks, blends, _, _ = coalesce_areas(FRAME, [first, second], [None, None], MARGIN)
+    assert len(areas) == 1
+    merged = frame_weights(RegionPlan(FRAME, areas, MARGIN, masks, blends))
+    single_first = frame_weights(RegionPlan(FRAME, [first], MARGIN))
+    single_second = frame_weights(RegionPlan(FRAME, [second], MARGIN))
+
+    # Each area's weights are kept where the other one does not reach
+    only_first = single_second == 0
+    only_second = single_first == 0
+    assert (merged[only_first] == single_first[only_first]).all()
+    assert (merged[only_second] == single_second[only_second]).all()
+    assert (merged == np.maximum(single_first, single_second)).all()
+    # Feather ramps up outside the rectangle edge, no jump from zero
+    row = merged[130, 282:301]
+    assert row[0] == 0 and (np.diff(row) >= 0).all() and np.diff(row).max() < 64
@@ -0,0 +1,17 @@
+import pytest
+
+from watermark_engine import ProcessingConfig, WatermarkEngine
+
+
+def test_process_mode_window_covers_all_workers():
+    engine = WatermarkEngine({"execution_mode": "process", "process_count": 24, "max_in_flight": 16,
+                              "cache_size_mb": 0})
+    assert engine.pipeline_window() == 48
+
+    engine = WatermarkEngine({"execution_mode": "thread", "max_in_flight": 16, "cache_size_mb": 0})
+    assert engine.pipeline_window() == 16
+
+
+def test_in_flight_window_must_be_positive():
+    with pytest.raises(ValueError):
+        ProcessingConfig.from_settings({"max_in_flight": 0})
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from watermark_engine import ProcessingConfig, RegionPlan, remove_watermark_advanced
+
+FRAME = (360, 640, 3)
+MARGIN = 20
+
+
+@pytest.mark.parametrize("area", [
+    (-5, 10, 40, 40),     # left
+    (610, 10, 40, 40),    # right
+    (100, -8, 40, 40),    # top
+    (100, 340, 40, 40),   # bottom
+    (-10, -10, 660, 380), # every side
+])
+def test_area_partly_off_frame_is_clipped(area):
+    plan = RegionPlan(FRAME, [area], MARGIN)
+    assert len(plan.areas) == 1
+    area_plan = plan.areas[0]
+    x, y, w, h = area
+    inner_y, inner_x = area_plan.inner
+    assert inner_x.start >= 0 and inner_y.start >= 0
+    # Only the part inside the frame is filled
+    assert inner_x.stop - inner_x.start == min(FRAME[1], x + w) - max(0, x)
+    assert inner_y.stop - inner_y.start == min(FRAME[0], y + h) - max(0, y)
+    assert (area_plan.mask[area_plan.inner] == 255).all()
+
+    frame = np.random.default_rng(0).integers(0, 256, FRAME, dtype=np.uint8)
+    remove_watermark_advanced(frame, plan, ProcessingConfig.from_settings({}))
+
+
+def test_area_outside_frame_is_skipped():
+    plan = RegionPlan(FRAME, [(-50, 10, 40, 40), (700, 10, 40, 40), (10, 10, 40, 40)], MARGIN)
+    assert plan.area_indices == [2]
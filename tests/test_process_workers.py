@@ -0,0 +1,70 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+import watermark_pipeline
+from watermark_pipeline import FramePipeline, ProcessWorkers
+
+SHAPE = (4, 6, 3)
+
+
+def add(frame, amount):
+    return frame + amount
+
+
+def assert_unlinked(name):
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
+
+
+def test_slots_are_reused_when_window_equals_slot_count():
+    count = 12
+    frames = iter([np.full(SHAPE, i, dtype=np.uint8) for i in range(count)])
+    written = []
+
+    def write_frame(index, frame):
+        # Frames are views of their slot, valid until the slot is reused
+        written.append(int(frame[0, 0, 0]))
+
+    workers = ProcessWorkers(add, (10,), SHAPE, slots=2, max_workers=2)
+    try:
+        assert FramePipeline(lambda: next(frames, None), workers, write_frame, window=2).run() == count
+    finally:
+        workers.close()
+    assert written == [i + 10 for i in range(count)]
+
+
+def test_frame_shape_mismatch_is_rejected():
+    workers = ProcessWorkers(add, (1,), SHAPE, slots=2, max_workers=1)
+    try:
+        with pytest.raises(ValueError):
+            workers.submit(0, np.zeros((6, 4, 3), dtype=np.uint8))
+    finally:
+        workers.close()
+
+
+def test_close_unlinks_shared_memory():
+    workers = ProcessWorkers(add, (1,), SHAPE, slots=2, max_workers=1)
+    name = workers.shm.name
+    future = workers.submit(0, np.zeros(SHAPE, dtype=np.uint8))
+    assert (workers.result(0, future) == 1).all()
+    workers.close()
+    assert_unlinked(name)
+
+
+def test_constructor_failure_unlinks_shared_memory(monkeypatch):
+    created = []
+
+    class RecordingSharedMemory(shared_memory.SharedMemory):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            created.append(self.name)
+
+    monkeypatch.setattr(watermark_pipeline.shared_memory, "SharedMemory", RecordingSharedMemory)
+    # No worker processes is rejected by the pool after the ring was created
+    with pytest.raises(ValueError):
+        ProcessWorkers(add, (1,), SHAPE, slots=2, max_workers=0)
+    assert len(created) == 1
+    monkeypatch.undo()
+    assert_unlinked(created[0])
@@ -0,0 +1,13 @@
+import numpy as np
+
+from watermark_engine import ProcessingConfig, RegionPlan, choose_inpaint_scale, get_watermark_areas
+
+
+def test_auto_inpaint_scale_depends_only_on_areas_and_method():
+    frame = np.zeros((2160, 3840, 3), dtype=np.uint8)
+    plan = RegionPlan(frame.shape, get_watermark_areas(frame, ["bottom_right"]), 20)
+    telea = ProcessingConfig.from_settings({"inpaint_scale": 0, "inpaint_method": "telea"})
+    laplace = ProcessingConfig.from_settings({"inpaint_scale": 0, "inpaint_method": "laplace"})
+
+    assert {choose_inpaint_scale(plan, telea) for _ in range(5)} == {8}
+    assert choose_inpaint_scale(plan, laplace) < 8
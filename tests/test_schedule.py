@@ -0,0 +1,98 @@
+import cv2
+import numpy as np
+
+import watermark_engine
+from watermark_engine import WatermarkEngine
+from watermark_schedule import AreaSchedule, TimeRange, time_range_frames
+
+
+class CaptureWriter:
+    def __init__(self, path):
+        self.path = path
+        self.frames = []
+
+    def write(self, frame):
+        self.frames.append(frame.copy())
+
+    def release(self):
+        self.path.write_bytes(b"")
+
+
+def make_video(path, count=20):
+    rng = np.random.default_rng(3)
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 25, (160, 120))
+    for _ in range(count):
+        writer.write(rng.integers(40, 220, (120, 160, 3), dtype=np.uint8))
+    writer.release()
+    capture = cv2.VideoCapture(str(path))
+    frames = []
+    while True:
+        ok, frame = capture.read()
+        if not ok:
+            return frames
+        frames.append(frame)
+
+
+def test_idle_frames_pass_through_with_multi_frame_denoise(tmp_path, monkeypatch):
+    source = make_video(tmp_path / "in.avi")
+    writer = CaptureWriter(tmp_path / "out.avi")
+    monkeypatch.setattr(watermark_engine, "open_writer", lambda *args, **kwargs: writer)
+    # Active in frames 0-9 only (0.4 s at 25 fps)
+    areas = [(40, 30, 40, 30, None, TimeRange(0, 0.4, "s"))]
+    settings = {"denoise": True, "denoise_frames": 3, "copy_streams": False, "cache_size_mb": 0}
+    engine = WatermarkEngine(settings, areas)
+
+    assert engine.process_video(str(tmp_path / "in.avi"), str(tmp_path / "out.avi"), []) == 20
+
+    assert len(writer.frames) == 20
+    for index in range(10, 20):
+        assert (writer.frames[index] == source[index]).all()
+    assert (writer.frames[0][30:60, 40:80] != source[0][30:60, 40:80]).any()
+
+
+def test_seconds_round_to_the_frame_shown_at_that_time():
+    # 2.0 s at 25 fps is frame 50 despite float error, later instants start at the next frame
+    assert time_range_frames(TimeRange(2.0, 4.0, "s"), 25) == (50, 100)
+    assert time_range_frames(TimeRange(0.1 * 3, 0.7, "s"), 10) == (3, 7)
+    assert time_range_frames(TimeRange(1.01, 1.99, "s"), 25) == (26, 50)
+    assert time_range_frames(TimeRange(None, None, "s"), 25) == (0, None)
+    assert time_range_frames(TimeRange(-1, 5, "frame"), 25) == (0, 5)
+
+
+def test_active_areas_of_overlapping_adjacent_and_open_ranges():
+    schedule = AreaSchedule([
+        TimeRange(10, 20, "frame"),
+        TimeRange(15, 30, "frame"),  # overlaps the first
+        TimeRange(30, 40, "frame"),  # starts where the second ends
+        TimeRange(50, None, "frame"),  # to the end
+        TimeRange(None, 5, "frame"),  # from the start
+    ], fps=25)
+    expected = {0: (4,), 4: (4,), 5: (), 9: (), 10: (0,), 14: (0,), 15: (0, 1), 19: (0, 1),
+                20: (1,), 29: (1,), 30: (2,), 39: (2,), 40: (), 49: (), 50: (3,), 10 ** 6: (3,)}
+    for frame, areas in expected.items():
+        assert schedule.active(frame) == areas, frame
+
+
+def test_whole_video_area_is_always_active():
+    schedule = AreaSchedule([None, TimeRange(1.0, 2.0, "s")], fps=25)
+    assert schedule.active(0) == (0,)
+    assert schedule.active(25) == (0, 1)
+    assert schedule.active(50) == (0,)
+    assert schedule.count_idle(0, 100) == 0
+
+
+def test_idle_frames_are_counted_within_the_processed_range():
+    schedule = AreaSchedule([TimeRange(10, 20, "frame"), TimeRange(20, 30, "frame"),
+                             TimeRange(50, None, "frame")], fps=25)
+    # Idle: 0-9 and 30-49
+    assert schedule.count_idle(0, 100) == 30
+    assert schedule.count_idle(0, 10) == 10
+    assert schedule.count_idle(5, 10) == 5
+    assert schedule.count_idle(25, 10) == 5
+    assert schedule.count_idle(45, 20) == 5
+    assert schedule.count_idle(60, 40) == 0
+    # Edges in seconds: 0.4 s to 0.8 s at 25 fps is frames 10-19
+    schedule = AreaSchedule([TimeRange(0.4, 0.8, "s")], fps=25)
+    assert schedule.active(9) == () and schedule.active(10) == (0,)
+    assert schedule.active(19) == (0,) and schedule.active(20) == ()
+    assert schedule.count_idle(0, 30) == 20
@@ -0,0 +1,45 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from watermark_engine import RegionPlan
+from watermark_temporal import TemporalFill
+
+
+def slow_fill(region):
+    time.sleep(0.2)
+    return region.copy()
+
+
+def test_areas_are_filled_in_parallel():
+    frame = np.full((200, 400, 3), 100, dtype=np.uint8)
+    plan = RegionPlan(frame.shape, [(10 + 90 * i, 20, 40, 40) for i in range(4)], 10)
+    temporal = TemporalFill()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(lambda area_plan: temporal.fill(area_plan, frame[area_plan.outer], slow_fill),
+                          plan.areas))
+    assert time.perf_counter() - start < 0.6
+
+
+def test_static_frames_reuse_the_fill():
+    frame = np.full((100, 100, 3), 100, dtype=np.uint8)
+    area_plan = RegionPlan(frame.shape, [(30, 30, 40, 40)], 10).areas[0]
+    temporal = TemporalFill(history=3)
+    calls = []
+
+    def compute_fill(region):
+        calls.append(region)
+        return region.copy()
+
+    for _ in range(10):
+        temporal.fill(area_plan, frame[area_plan.outer], compute_fill)
+    # First frame, then the median of 2 and 3 frames
+    assert len(calls) == 3
+
+    moved = frame.copy()
+    moved[20:80, 20:80] = 200
+    temporal.fill(area_plan, moved[area_plan.outer], compute_fill)
+    assert len(calls) == 4
@@ -1,17 +1,18 @@
 import cv2
-import numpy as np
 import tkinter as tk
 from tkinter import filedialog, messagebox, Toplevel, ttk
 from ttkbootstrap import Style
 from ttkbootstrap.widgets import Button, Label, Frame, Meter, Checkbutton, Scale
 import os
 from PIL import Image, ImageTk
-import json
 import threading
 import logging
-from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import queue
+from watermark_engine import (WatermarkEngine, save_areas_file, load_areas_file,
+                              default_output_path)
+from watermark_io import ENCODER_PRESETS
+from watermark_mask import polygon_mask, stroke_mask
+from watermark_schedule import TimeRange
 
 class WatermarkRemoverApp:
     def __init__(self, root):
@@ -33,7 +34,6 @@ class WatermarkRemoverApp:
         self.processing_cancelled = False
         self.processing_thread = None
         self.preview_window = None
-        self.frame_queue = queue.Queue(maxsize=10)
         
         # Main frame
         self.main_frame = Frame(self.root, padding=20)
@@ -124,6 +124,12 @@ class WatermarkRemoverApp:
                    variable=self.bottom_left_var).grid(row=1, column=0, padx=5, sticky=tk.W)
         Checkbutton(corners_grid, text="Top right corner", 
                    variable=self.top_right_var).grid(row=1, column=1, padx=5, sticky=tk.W)
+        self.auto_detect_var = tk.BooleanVar(value=False)
+        Checkbutton(corners_grid, text="Detect automatically", 
+                   variable=self.auto_detect_var).grid(row=2, column=0, padx=5, sticky=tk.W)
+        self.track_areas_var = tk.BooleanVar(value=False)
+        Checkbutton(corners_grid, text="Follow moving logo", 
+                   variable=self.track_areas_var).grid(row=2, column=1, padx=5, sticky=tk.W)
         
         # Manual area setup buttons
         custom_frame = Frame(self.main_tab, padding=10)
@@ -162,12 +168,25 @@ class WatermarkRemoverApp:
         Label(method_frame, text="Inpainting method:").pack(side=tk.LEFT, padx=5)
         
         self.inpaint_method = tk.StringVar(value="mixed")
-        methods = [("Mixed", "mixed"), ("Telea", "telea"), ("Navier-Stokes", "ns")]
+        methods = [("Mixed", "mixed"), ("Telea", "telea"), ("Navier-Stokes", "ns"),
+                   ("Temporal (static shots)", "temporal"),
+                   ("Laplace (smooth background)", "laplace"),
+                   ("PatchMatch (textured background)", "patchmatch")]
         
         for text, value in methods:
             tk.Radiobutton(method_frame, text=text, variable=self.inpaint_method, 
                           value=value).pack(side=tk.LEFT, padx=5)
         
+        # Multi-resolution inpainting
+        self.use_pyramid = tk.BooleanVar(value=False)
+        Checkbutton(algo_frame, text="Multi-resolution inpainting for large areas (automatic scale)", 
+                   variable=self.use_pyramid).pack(anchor=tk.W, pady=5)
+        
+        # Semi-transparent logo reversal
+        self.alpha_unblend = tk.BooleanVar(value=False)
+        Checkbutton(algo_frame, text="Reverse semi-transparent logo (estimated from frames across the video)", 
+                   variable=self.alpha_unblend).pack(anchor=tk.W, pady=5)
+        
         # Blur strength
         blur_frame = Frame(algo_frame)
         blur_frame.pack(fill=tk.X, pady=5)
@@ -178,6 +197,17 @@ class WatermarkRemoverApp:
               orient=tk.HORIZONTAL, length=300).pack(side=tk.LEFT, padx=5)
         Label(blur_frame, textvariable=self.blur_strength).pack(side=tk.LEFT)
         
+        # Smoothing filter
+        smoothing_frame = Frame(algo_frame)
+        smoothing_frame.pack(fill=tk.X, pady=5)
+        
+        Label(smoothing_frame, text="Smoothing filter:").pack(side=tk.LEFT, padx=5)
+        
+        self.smoothing_filter = tk.StringVar(value="bilateral")
+        for text, value in [("Bilateral", "bilateral"), ("Guided (fast)", "guided")]:
+            tk.Radiobutton(smoothing_frame, text=text, variable=self.smoothing_filter, 
+                          value=value).pack(side=tk.LEFT, padx=5)
+        
         # Margin size
         margin_frame = Frame(algo_frame)
         margin_frame.pack(fill=tk.X, pady=5)
@@ -188,6 +218,11 @@ class WatermarkRemoverApp:
               orient=tk.HORIZONTAL, length=300).pack(side=tk.LEFT, padx=5)
         Label(margin_frame, textvariable=self.margin_size).pack(side=tk.LEFT)
         
+        # Merging of overlapping areas
+        self.merge_areas = tk.BooleanVar(value=True)
+        Checkbutton(algo_frame, text="Merge overlapping areas (shared pixels inpainted once)", 
+                   variable=self.merge_areas).pack(anchor=tk.W, pady=5)
+        
         # Performance settings
         perf_frame = Frame(self.settings_tab, padding=10)
         perf_frame.pack(fill=tk.X, pady=10)
@@ -214,6 +249,36 @@ class WatermarkRemoverApp:
         self.use_buffering = tk.BooleanVar(value=True)
         Checkbutton(perf_frame, text="Enable frame buffering", 
                    variable=self.use_buffering).pack(anchor=tk.W, pady=5)
+        
+        # Frames between decoding and encoding
+        in_flight_frame = Frame(perf_frame)
+        in_flight_frame.pack(fill=tk.X, pady=5)
+        
+        Label(in_flight_frame, text="Frames in flight:").pack(side=tk.LEFT, padx=5)
+        self.max_in_flight = tk.IntVar(value=16)
+        Scale(in_flight_frame, from_=1, to=64, variable=self.max_in_flight, 
+              orient=tk.HORIZONTAL, length=300).pack(side=tk.LEFT, padx=5)
+        Label(in_flight_frame, textvariable=self.max_in_flight).pack(side=tk.LEFT)
+        
+        # Process-based frame workers
+        self.use_processes = tk.BooleanVar(value=False)
+        Checkbutton(perf_frame, text="Run frame workers in separate processes (uses all cores)", 
+                   variable=self.use_processes).pack(anchor=tk.W, pady=5)
+        
+        # Segment-parallel processing
+        self.use_segments = tk.BooleanVar(value=False)
+        Checkbutton(perf_frame, text="Split long videos at keyframes and process segments in parallel (FFmpeg)", 
+                   variable=self.use_segments).pack(anchor=tk.W, pady=5)
+        
+        # Cache of inpainted areas for repeated content
+        cache_frame = Frame(perf_frame)
+        cache_frame.pack(fill=tk.X, pady=5)
+        
+        Label(cache_frame, text="Inpaint cache (MB, 0 = off):").pack(side=tk.LEFT, padx=5)
+        self.cache_size_mb = tk.IntVar(value=64)
+        Scale(cache_frame, from_=0, to=512, variable=self.cache_size_mb, 
+              orient=tk.HORIZONTAL, length=300).pack(side=tk.LEFT, padx=5)
+        Label(cache_frame, textvariable=self.cache_size_mb).pack(side=tk.LEFT)
     
     def create_advanced_tab(self):
         """Create advanced tab"""
@@ -228,6 +293,14 @@ class WatermarkRemoverApp:
         Checkbutton(post_frame, text="Noise reduction", 
                    variable=self.denoise_var).pack(anchor=tk.W, pady=2)
         
+        self.denoise_frame_var = tk.BooleanVar(value=False)
+        Checkbutton(post_frame, text="Noise reduction on the whole frame (slow)", 
+                   variable=self.denoise_frame_var).pack(anchor=tk.W, pady=2)
+        
+        self.denoise_multi_var = tk.BooleanVar(value=False)
+        Checkbutton(post_frame, text="Noise reduction with neighbouring frames (5 frames)", 
+                   variable=self.denoise_multi_var).pack(anchor=tk.W, pady=2)
+        
         self.sharpen_var = tk.BooleanVar(value=False)
         Checkbutton(post_frame, text="Sharpening", 
                    variable=self.sharpen_var).pack(anchor=tk.W, pady=2)
@@ -236,6 +309,10 @@ class WatermarkRemoverApp:
         Checkbutton(post_frame, text="Automatic color correction", 
                    variable=self.color_correction_var).pack(anchor=tk.W, pady=2)
         
+        self.color_areas_only_var = tk.BooleanVar(value=False)
+        Checkbutton(post_frame, text="Color correction only in watermark areas", 
+                   variable=self.color_areas_only_var).pack(anchor=tk.W, pady=2)
+        
         # Preview
         preview_frame = Frame(self.advanced_tab, padding=10)
         preview_frame.pack(fill=tk.X, pady=10)
@@ -273,6 +350,50 @@ class WatermarkRemoverApp:
         for text, value in codecs:
             tk.Radiobutton(codec_frame, text=text, variable=self.output_codec, 
                           value=value).pack(side=tk.LEFT, padx=5)
+        
+        # Video backend (FFmpeg falls back to OpenCV if not installed)
+        backend_frame = Frame(output_frame)
+        backend_frame.pack(fill=tk.X, pady=5)
+        
+        Label(backend_frame, text="Backend:").pack(side=tk.LEFT, padx=5)
+        self.video_backend = tk.StringVar(value="opencv")
+        backends = [("OpenCV", "opencv"), ("FFmpeg", "ffmpeg")]
+        
+        for text, value in backends:
+            tk.Radiobutton(backend_frame, text=text, variable=self.video_backend, 
+                          value=value).pack(side=tk.LEFT, padx=5)
+        
+        # FFmpeg encoder options
+        preset_frame = Frame(output_frame)
+        preset_frame.pack(fill=tk.X, pady=5)
+        
+        Label(preset_frame, text="Encoder preset:").pack(side=tk.LEFT, padx=5)
+        self.encoder_preset = tk.StringVar(value="medium")
+        ttk.Combobox(preset_frame, textvariable=self.encoder_preset, values=ENCODER_PRESETS, 
+                     state="readonly", width=12).pack(side=tk.LEFT, padx=5)
+        
+        crf_frame = Frame(output_frame)
+        crf_frame.pack(fill=tk.X, pady=5)
+        
+        Label(crf_frame, text="CRF (quality):").pack(side=tk.LEFT, padx=5)
+        self.encoder_crf = tk.IntVar(value=23)
+        Scale(crf_frame, from_=0, to=51, variable=self.encoder_crf, 
+              orient=tk.HORIZONTAL, length=300).pack(side=tk.LEFT, padx=5)
+        Label(crf_frame, textvariable=self.encoder_crf).pack(side=tk.LEFT)
+        
+        encoder_threads_frame = Frame(output_frame)
+        encoder_threads_frame.pack(fill=tk.X, pady=5)
+        
+        Label(encoder_threads_frame, text="Encoder threads (0 = auto):").pack(side=tk.LEFT, padx=5)
+        self.encoder_threads = tk.IntVar(value=0)
+        Scale(encoder_threads_frame, from_=0, to=32, variable=self.encoder_threads, 
+              orient=tk.HORIZONTAL, length=300).pack(side=tk.LEFT, padx=5)
+        Label(encoder_threads_frame, textvariable=self.encoder_threads).pack(side=tk.LEFT)
+        
+        # Audio, subtitles and metadata passthrough
+        self.copy_streams_var = tk.BooleanVar(value=True)
+        Checkbutton(output_frame, text="Keep audio, subtitles and metadata (requires FFmpeg)", 
+                   variable=self.copy_streams_var).pack(anchor=tk.W, pady=5)
     
     def create_batch_tab(self):
         """Create batch processing tab"""
@@ -401,11 +522,39 @@ class WatermarkRemoverApp:
         
         # Instructions
         instructions = Label(self.custom_window, 
-                           text="Click and drag to draw rectangles. " +
-                                "Right-click to remove the last rectangle.",
+                           text="Click and drag to draw rectangles, click polygon corners " +
+                                "(double-click closes) or paint with the brush. " +
+                                "Right-click to remove the last area.",
                            font=("Helvetica", 10))
         instructions.pack(pady=5)
         
+        # Drawing tools
+        tool_frame = Frame(self.custom_window)
+        tool_frame.pack(pady=5)
+        
+        self.draw_mode = tk.StringVar(value="rectangle")
+        for text, value in [("Rectangle", "rectangle"), ("Polygon", "polygon"), ("Brush", "brush")]:
+            tk.Radiobutton(tool_frame, text=text, variable=self.draw_mode, 
+                          value=value).pack(side=tk.LEFT, padx=5)
+        
+        # Brush size in video pixels
+        Label(tool_frame, text="Brush size:").pack(side=tk.LEFT, padx=5)
+        self.brush_size = tk.IntVar(value=12)
+        Scale(tool_frame, from_=2, to=60, variable=self.brush_size, 
+              orient=tk.HORIZONTAL, length=150).pack(side=tk.LEFT, padx=5)
+        Label(tool_frame, textvariable=self.brush_size).pack(side=tk.LEFT)
+        
+        # Time range of the next areas in seconds, empty: whole video
+        time_frame = Frame(self.custom_window)
+        time_frame.pack(pady=5)
+        
+        Label(time_frame, text="Active from (s):").pack(side=tk.LEFT, padx=5)
+        self.area_start = tk.StringVar()
+        tk.Entry(time_frame, textvariable=self.area_start, width=8).pack(side=tk.LEFT)
+        Label(time_frame, text="to:").pack(side=tk.LEFT, padx=5)
+        self.area_end = tk.StringVar()
+        tk.Entry(time_frame, textvariable=self.area_end, width=8).pack(side=tk.LEFT)
+        
         # Scale image for preview
         height, width = self.first_frame.shape[:2]
         max_size = 600
@@ -430,12 +579,16 @@ class WatermarkRemoverApp:
         self.start_y = None
         self.current_rect = None
         self.drawn_rects = []
+        # Polygon corners or brush points (preview coordinates) and their canvas lines
+        self.shape_points = []
+        self.shape_items = []
         
         # Bind events
         self.canvas.bind("<Button-1>", self.start_rectangle)
         self.canvas.bind("<B1-Motion>", self.update_rectangle)
         self.canvas.bind("<ButtonRelease-1>", self.end_rectangle)
         self.canvas.bind("<Button-3>", self.remove_last_rectangle)
+        self.canvas.bind("<Double-Button-1>", lambda event: self.finish_shape())
         
         # Buttons
         button_frame = Frame(self.custom_window)
@@ -450,6 +603,10 @@ class WatermarkRemoverApp:
     
     def start_rectangle(self, event):
         """Start drawing rectangle"""
+        if self.draw_mode.get() != "rectangle":
+            self.current_rect = None
+            self.add_shape_point(event)
+            return
         self.start_x = self.canvas.canvasx(event.x)
         self.start_y = self.canvas.canvasy(event.y)
         self.current_rect = self.canvas.create_rectangle(
@@ -459,6 +616,9 @@ class WatermarkRemoverApp:
     
     def update_rectangle(self, event):
         """Update drawn rectangle"""
+        if self.draw_mode.get() == "brush":
+            self.add_shape_point(event)
+            return
         if self.current_rect:
             curr_x = self.canvas.canvasx(event.x)
             curr_y = self.canvas.canvasy(event.y)
@@ -466,6 +626,9 @@ class WatermarkRemoverApp:
     
     def end_rectangle(self, event):
         """Finish drawing rectangle"""
+        if self.draw_mode.get() == "brush":
+            self.finish_shape()
+            return
         if self.current_rect:
             curr_x = self.canvas.canvasx(event.x)
             curr_y = self.canvas.canvasy(event.y)
@@ -484,13 +647,76 @@ class WatermarkRemoverApp:
             orig_h = int((y2 - y1) / self.preview_scale)
             
             if orig_w > 10 and orig_h > 10:  # Minimum size
-                self.custom_areas.append((orig_x1, orig_y1, orig_w, orig_h))
+                self.custom_areas.append(self.with_time_range((orig_x1, orig_y1, orig_w, orig_h)))
                 self.drawn_rects.append(self.current_rect)
                 # Change color to green after saving
                 self.canvas.itemconfig(self.current_rect, outline="green")
     
+    def add_shape_point(self, event):
+        """Add polygon corner or brush point"""
+        point = (self.canvas.canvasx(event.x), self.canvas.canvasy(event.y))
+        if self.shape_points:
+            width = 2
+            if self.draw_mode.get() == "brush":
+                width = max(1, round(self.brush_size.get() * self.preview_scale))
+            self.shape_items.append(self.canvas.create_line(
+                *self.shape_points[-1], *point, fill="red", width=width, capstyle=tk.ROUND
+            ))
+        self.shape_points.append(point)
+    
+    def discard_shape(self):
+        """Remove unfinished shape"""
+        for item in self.shape_items:
+            self.canvas.delete(item)
+        self.shape_points = []
+        self.shape_items = []
+    
+    def finish_shape(self):
+        """Finish polygon or brush stroke as a masked area"""
+        points = [(int(x / self.preview_scale), int(y / self.preview_scale))
+                  for x, y in self.shape_points]
+        preview_points = [coord for point in self.shape_points for coord in point]
+        brush = self.draw_mode.get() == "brush"
+        self.discard_shape()
+        if brush and points:
+            size = int(self.brush_size.get())
+            area = stroke_mask(points, size)
+            if len(preview_points) == 2:
+                preview_points *= 2
+            item = self.canvas.create_line(*preview_points, fill="green", capstyle=tk.ROUND,
+                                           width=max(1, round(size * self.preview_scale)))
+        elif not brush and len(points) >= 3:
+            area = polygon_mask(points)
+            item = self.canvas.create_polygon(*preview_points, outline="green", fill="", width=2)
+        else:
+            return
+        
+        # Masked area: only its pixels are inpainted
+        if area is not None:
+            self.custom_areas.append(self.with_time_range(area))
+            self.drawn_rects.append(item)
+        else:
+            self.canvas.delete(item)
+    
+    def with_time_range(self, area):
+        """Attach the drawing window's time range to area, if one is set"""
+        start, end = self.area_start.get().strip(), self.area_end.get().strip()
+        if not start and not end:
+            return area
+        try:
+            time_range = TimeRange(float(start) if start else None, float(end) if end else None, "s")
+        except ValueError:
+            messagebox.showwarning("Warning", "Invalid time range, the area covers the whole video.")
+            return area
+        mask = area[4] if len(area) > 4 else None
+        return tuple(area[:4]) + (mask, time_range)
+    
     def remove_last_rectangle(self, event):
         """Remove last drawn rectangle"""
+        if self.shape_points:
+            # Unfinished shape is discarded first
+            self.discard_shape()
+            return
         if self.drawn_rects and self.custom_areas:
             rect_to_remove = self.drawn_rects.pop()
             self.canvas.delete(rect_to_remove)
@@ -507,6 +733,8 @@ class WatermarkRemoverApp:
         """Clear all areas on canvas"""
         self.custom_areas = []
         self.drawn_rects = []
+        self.shape_points = []
+        self.shape_items = []
         self.canvas.delete("all")
         # Restore image
         self.canvas.create_image(0, 0, anchor=tk.NW, image=self.photo)
@@ -532,22 +760,8 @@ class WatermarkRemoverApp:
         )
         if filepath:
             try:
-                data = {
-                    "areas": self.custom_areas,
-                    "corners": {
-                        "bottom_right": self.bottom_right_var.get(),
-                        "top_left": self.top_left_var.get(),
-                        "bottom_left": self.bottom_left_var.get(),
-                        "top_right": self.top_right_var.get()
-                    },
-                    "settings": {
-                        "inpaint_method": self.inpaint_method.get(),
-                        "blur_strength": self.blur_strength.get(),
-                        "margin_size": self.margin_size.get()
-                    }
-                }
-                with open(filepath, 'w') as f:
-                    json.dump(data, f, indent=2)
+                save_areas_file(filepath, self.custom_areas, 
+                                self.get_selected_corners(), self.get_settings())
                 messagebox.showinfo("Success", "Areas have been saved!")
                 logging.info(f"Areas saved to: {filepath}")
             except Exception as e:
@@ -561,21 +775,21 @@ class WatermarkRemoverApp:
         )
         if filepath:
             try:
-                with open(filepath, 'r') as f:
-                    data = json.load(f)
+                areas, corners, settings = load_areas_file(filepath)
                 
-                self.custom_areas = data.get("areas", [])
-                corners = data.get("corners", {})
-                self.bottom_right_var.set(corners.get("bottom_right", False))
-                self.top_left_var.set(corners.get("top_left", False))
-                self.bottom_left_var.set(corners.get("bottom_left", False))
-                self.top_right_var.set(corners.get("top_right", False))
+                self.custom_areas = areas
+                self.bottom_right_var.set("bottom_right" in corners)
+                self.top_left_var.set("top_left" in corners)
+                self.bottom_left_var.set("bottom_left" in corners)
+                self.top_right_var.set("top_right" in corners)
                 
                 # Load settings if they exist
-                if "settings" in data:
-                    settings = data["settings"]
+                if settings:
+                    self.auto_detect_var.set(settings.get("auto_detect", False))
+                    self.track_areas_var.set(settings.get("track_areas", False))
                     self.inpaint_method.set(settings.get("inpaint_method", "mixed"))
                     self.blur_strength.set(settings.get("blur_strength", 11))
+                    self.smoothing_filter.set(settings.get("smoothing_filter", "bilateral"))
                     self.margin_size.set(settings.get("margin_size", 20))
                 
                 self.update_areas_info()
@@ -614,126 +828,38 @@ class WatermarkRemoverApp:
         self.input_paths = []
         self.batch_process_button.config(state=tk.DISABLED)
     
-    def get_watermark_areas(self, frame, corners):
-        """Return watermark areas"""
-        height, width = frame.shape[:2]
-        watermark_areas = self.custom_areas.copy()
-        
-        if "bottom_right" in corners:
-            default_x = int(width * 0.75)
-            default_y = int(height * 0.75)
-            default_w = int(width * 0.25)
-            default_h = int(height * 0.25)
-            watermark_areas.append((default_x, default_y, default_w, default_h))
-        
-        if "top_left" in corners:
-            default_x_top = 0
-            default_y_top = 0
-            default_w_top = int(width * 0.2)
-            default_h_top = int(height * 0.2)
-            watermark_areas.append((default_x_top, default_y_top, default_w_top, default_h_top))
-        
-        if "bottom_left" in corners:
-            default_x_bottom = 0
-            default_y_bottom = int(height * 0.8)
-            default_w_bottom = int(width * 0.2)
-            default_h_bottom = int(height * 0.2)
-            watermark_areas.append((default_x_bottom, default_y_bottom, default_w_bottom, default_h_bottom))
-        
-        if "top_right" in corners:
-            default_x_top_right = int(width * 0.8)
-            default_y_top_right = 0
-            default_w_top_right = int(width * 0.2)
-            default_h_top_right = int(height * 0.2)
-            watermark_areas.append((default_x_top_right, default_y_top_right, default_w_top_right, default_h_top_right))
-        
-        return watermark_areas
-    
-    def remove_watermark_advanced(self, frame, watermark_areas):
-        """Advanced watermark removal method"""
-        result = frame.copy()
-        margin = self.margin_size.get()
-        
-        for (x, y, w, h) in watermark_areas:
-            # Expand analysis area
-            x1, y1 = max(0, x - margin), max(0, y - margin)
-            x2, y2 = min(frame.shape[1], x + w + margin), min(frame.shape[0], y + h + margin)
-            
-            # Extract working area
-            working_area = frame[y1:y2, x1:x2].copy()
-            
-            # Create mask
-            mask = np.zeros(working_area.shape[:2], dtype=np.uint8)
-            mask_x1 = x - x1
-            mask_y1 = y - y1
-            mask_x2 = mask_x1 + w
-            mask_y2 = mask_y1 + h
-            cv2.rectangle(mask, (mask_x1, mask_y1), (mask_x2, mask_y2), 255, -1)
-            
-            # Choose inpainting method
-            method = self.inpaint_method.get()
-            if method == "telea":
-                inpainted = cv2.inpaint(working_area, mask, 7, cv2.INPAINT_TELEA)
-            elif method == "ns":
-                inpainted = cv2.inpaint(working_area, mask, 7, cv2.INPAINT_NS)
-            else:  # mixed
-                # Texture analysis
-                gray = cv2.cvtColor(working_area, cv2.COLOR_BGR2GRAY)
-                texture_score = np.std(gray)
-                
-                if texture_score > 30:
-                    inpainted = cv2.inpaint(working_area, mask, 7, cv2.INPAINT_TELEA)
-                else:
-                    inpainted_ns = cv2.inpaint(working_area, mask, 7, cv2.INPAINT_NS)
-                    inpainted_telea = cv2.inpaint(working_area, mask, 7, cv2.INPAINT_TELEA)
-                    inpainted = cv2.addWeighted(inpainted_ns, 0.5, inpainted_telea, 0.5, 0)
-            
-            # Additional blur on watermark area
-            blur_strength = self.blur_strength.get()
-            if blur_strength > 1:
-                roi = inpainted[mask_y1:mask_y2, mask_x1:mask_x2]
-                blurred_roi = cv2.bilateralFilter(roi, d=blur_strength, sigmaColor=100, sigmaSpace=100)
-                inpainted[mask_y1:mask_y2, mask_x1:mask_x2] = blurred_roi
-            
-            # Gradient blending
-            blend_mask = np.zeros(working_area.shape[:2], dtype=np.float32)
-            cv2.rectangle(blend_mask, (mask_x1, mask_y1), (mask_x2, mask_y2), 1.0, -1)
-            blend_mask = cv2.GaussianBlur(blend_mask, (31, 31), 0)
-            
-            # Expand blend_mask to 3 channels
-            blend_mask_3ch = np.stack([blend_mask] * 3, axis=-1)
-            
-            # Blending
-            blended = (inpainted * blend_mask_3ch + working_area * (1 - blend_mask_3ch)).astype(np.uint8)
-            
-            # Insert back into image
-            result[y1:y2, x1:x2] = blended
-        
-        return result
-    
-    def apply_post_processing(self, frame):
-        """Apply post-processing"""
-        result = frame.copy()
-        
-        if self.denoise_var.get():
-            result = cv2.fastNlMeansDenoisingColored(result, None, 10, 10, 7, 21)
-        
-        if self.sharpen_var.get():
-            kernel = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])
-            result = cv2.filter2D(result, -1, kernel)
-        
-        if self.color_correction_var.get():
-            # Convert to LAB
-            lab = cv2.cvtColor(result, cv2.COLOR_BGR2LAB)
-            l, a, b = cv2.split(lab)
-            
-            # Equalize histogram of L channel
-            l = cv2.equalizeHist(l)
-            
-            # Merge and convert back
-            result = cv2.cvtColor(cv2.merge([l, a, b]), cv2.COLOR_LAB2BGR)
-        
-        return result
+    def get_settings(self):
+        """Return snapshot of processing settings"""
+        return {
+            "auto_detect": self.auto_detect_var.get(),
+            "track_areas": self.track_areas_var.get(),
+            "inpaint_method": self.inpaint_method.get(),
+            "inpaint_scale": 0 if self.use_pyramid.get() else 1,
+            "alpha_unblend": self.alpha_unblend.get(),
+            "blur_strength": self.blur_strength.get(),
+            "smoothing_filter": self.smoothing_filter.get(),
+            "margin_size": self.margin_size.get(),
+            "merge_areas": self.merge_areas.get(),
+            "denoise": self.denoise_var.get(),
+            "denoise_scope": "frame" if self.denoise_frame_var.get() else "areas",
+            "denoise_frames": 5 if self.denoise_multi_var.get() else 1,
+            "sharpen": self.sharpen_var.get(),
+            "color_correction": self.color_correction_var.get(),
+            "color_correction_scope": "areas" if self.color_areas_only_var.get() else "frame",
+            "thread_count": self.thread_count.get(),
+            "use_hw_accel": self.use_hw_accel.get(),
+            "use_buffering": self.use_buffering.get(),
+            "max_in_flight": self.max_in_flight.get(),
+            "execution_mode": "process" if self.use_processes.get() else "thread",
+            "segment_count": 0 if self.use_segments.get() else 1,
+            "cache_size_mb": self.cache_size_mb.get(),
+            "output_codec": self.output_codec.get(),
+            "video_backend": self.video_backend.get(),
+            "encoder_preset": self.encoder_preset.get(),
+            "encoder_crf": self.encoder_crf.get(),
+            "encoder_threads": self.encoder_threads.get(),
+            "copy_streams": self.copy_streams_var.get()
+        }
     
     def create_preview_window(self):
         """Create preview window"""
@@ -797,119 +923,29 @@ class WatermarkRemoverApp:
         try:
             self.update_status("Opening video...")
             
-            # Open video with optional hardware acceleration
-            cap = cv2.VideoCapture(input_path)
-            if self.use_hw_accel.get():
-                cap.set(cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY)
-            
-            # Get video parameters
-            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            
-            if total_frames <= 0:
-                raise Exception("Video contains no frames or is corrupted.")
-            
-            logging.info(f"Video: {width}x{height}, {fps} FPS, {total_frames} frames")
-            
-            # Codec configuration
-            codec_map = {
-                'mp4v': cv2.VideoWriter_fourcc(*'mp4v'),
-                'h264': cv2.VideoWriter_fourcc(*'H264'),
-                'xvid': cv2.VideoWriter_fourcc(*'XVID')
-            }
-            fourcc = codec_map.get(self.output_codec.get(), cv2.VideoWriter_fourcc(*'mp4v'))
-            
-            # Create writer
-            out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-            if not out.isOpened():
-                raise Exception(f"Cannot create output file: {output_path}")
-            
-            # Get watermark areas from first frame
-            ret, first_frame = cap.read()
-            if not ret:
-                raise Exception("Cannot read first frame.")
-            
-            watermark_areas = self.get_watermark_areas(first_frame, corners)
-            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            # Run headless engine, report progress to the UI
+            def on_progress(frame_count, total_frames):
+                progress = (frame_count / total_frames) * 100
+                self.update_progress(progress, f"Processing frame {frame_count}/{total_frames}")
             
-            # Processing with buffering
-            frame_count = 0
-            frame_buffer = []
-            buffer_size = 10 if self.use_buffering.get() else 1
+            engine = WatermarkEngine(self.get_settings(), self.custom_areas,
+                                     progress_callback=on_progress,
+                                     preview_callback=self.update_preview,
+                                     preview_frequency=self.preview_frequency.get(),
+                                     cancel_check=lambda: self.processing_cancelled)
+            frame_count = engine.process_video(input_path, output_path, corners)
             
-            # Use ThreadPoolExecutor for parallel processing
-            with ThreadPoolExecutor(max_workers=self.thread_count.get()) as executor:
-                futures = []
-                
-                while True:
-                    if self.processing_cancelled:
-                        self.update_status("Processing cancelled")
-                        break
-                    
-                    ret, frame = cap.read()
-                    if not ret:
-                        break
-                    
-                    # Add frame for processing
-                    future = executor.submit(self.process_single_frame, frame, watermark_areas)
-                    futures.append((frame_count, future))
-                    
-                    # Process buffer when full
-                    if len(futures) >= buffer_size:
-                        for fc, future in futures[:buffer_size]:
-                            processed_frame = future.result()
-                            out.write(processed_frame)
-                            
-                            # Update preview
-                            if fc % self.preview_frequency.get() == 0:
-                                self.update_preview(processed_frame, fc, total_frames)
-                        
-                        futures = futures[buffer_size:]
-                    
-                    frame_count += 1
-                    
-                    # Update progress
-                    progress = (frame_count / total_frames) * 100
-                    self.update_progress(progress, f"Processing frame {frame_count}/{total_frames}")
-                
-                # Process remaining frames
-                for fc, future in futures:
-                    if not self.processing_cancelled:
-                        processed_frame = future.result()
-                        out.write(processed_frame)
-            
-            # Finish
-            cap.release()
-            out.release()
-            cv2.destroyAllWindows()
-            
-            if not self.processing_cancelled:
+            if self.processing_cancelled:
+                self.update_status("Processing cancelled")
+            else:
                 file_size_mb = os.path.getsize(output_path) / (1024 * 1024)
                 self.update_status(f"Saved: {output_path} ({file_size_mb:.2f} MB)")
                 messagebox.showinfo("Success", f"Processed {frame_count} frames\nFile: {output_path}")
-                logging.info(f"Success: {frame_count} frames, {file_size_mb:.2f} MB")
             
         except Exception as e:
             self.update_status(f"Error: {str(e)}")
             messagebox.showerror("Error", f"An error occurred: {str(e)}")
             logging.error(f"Processing error: {e}")
-            
-            if 'cap' in locals():
-                cap.release()
-            if 'out' in locals():
-                out.release()
-    
-    def process_single_frame(self, frame, watermark_areas):
-        """Process single frame"""
-        # Remove watermark
-        processed = self.remove_watermark_advanced(frame, watermark_areas)
-        
-        # Apply post-processing
-        processed = self.apply_post_processing(processed)
-        
-        return processed
     
     def update_status(self, message):
         """Update status (thread-safe)"""
@@ -932,14 +968,13 @@ class WatermarkRemoverApp:
         
         # Check if areas are selected
         corners = self.get_selected_corners()
-        if not corners and not self.custom_areas:
+        if not corners and not self.custom_areas and not self.auto_detect_var.get():
             messagebox.showwarning("Warning", 
                                  "Please select at least one area to remove!")
             return
         
         # Prepare output path
-        base, ext = os.path.splitext(os.path.basename(self.input_path))
-        output_path = os.path.join(self.program_dir, f"{base}_no_watermark{ext}")
+        output_path = default_output_path(self.input_path, self.program_dir)
         
         # Reset cancellation
         self.processing_cancelled = False
@@ -1004,7 +1039,7 @@ class WatermarkRemoverApp:
             return
         
         corners = self.get_selected_corners()
-        if not corners and not self.custom_areas:
+        if not corners and not self.custom_areas and not self.auto_detect_var.get():
             messagebox.showwarning("Warning", 
                                  "Please select at least one area to remove!")
             return
@@ -1037,8 +1072,7 @@ class WatermarkRemoverApp:
                 self.update_status(f"Processing file {i+1}/{total_files}: {os.path.basename(input_path)}")
                 
                 # Prepare output path
-                base, ext = os.path.splitext(os.path.basename(input_path))
-                output_path = os.path.join(self.program_dir, f"{base}_no_watermark{ext}")
+                output_path = default_output_path(input_path, self.program_dir)
                 
                 # Process file
                 if not self.batch_same_areas.get() and i > 0:
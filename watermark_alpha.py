@@ -0,0 +1,114 @@
+"""
+Reversal of semi-transparent watermarks (alpha un-blending).
+
+A translucent logo is composited as  I = alpha * W + (1 - alpha) * B,  so
+the background B is still in the frame and comes back exactly once alpha and
+the logo colour W are known:  B = (I - alpha * W) / (1 - alpha).
+
+Both are estimated from frames sampled across the video. For every pixel the
+observed values are regressed against a smooth guess of the background (the
+harmonic fill from the pixels around it). The background changes from frame
+to frame while the logo does not, so the slope is 1 - alpha. Each further
+pass guesses the background only under the strokes found so far, from the
+real pixels right next to them. The logo colour is taken as one colour per
+area (the median over its clearly visible pixels). Nearly opaque pixels hide
+too much of the background to divide by 1 - alpha and are left to
+inpainting.
+"""
+from collections import namedtuple
+import cv2
+import numpy as np
+from watermark_laplace import laplace_fill
+
+# Alpha above which pixels are inpainted instead (noise is amplified by 1 / (1 - alpha))
+ALPHA_OPAQUE = 0.8
+# Alpha below which a pixel counts as not covered by the logo
+ALPHA_VISIBLE = 0.02
+# Variance (grey levels squared) added to the regression: pixels whose
+# background hardly changed across the samples lean towards opaque
+ALPHA_PRIOR = 25.0
+# Fewer usable samples than this and the area is inpainted as usual
+MIN_SAMPLES = 8
+# Regression passes, each with the background guess restricted to the strokes found so far
+ALPHA_PASSES = 3
+# Alpha of the pixels the logo colour is measured on
+ALPHA_COLOUR = 0.2
+
+# Per-area un-blending of the watermark rectangle:
+# restored = (observed - offset) * gain; opaque: area mask of pixels to inpaint, or None
+WatermarkModel = namedtuple("WatermarkModel", ["alpha", "gain", "offset", "opaque"])
+
+
+def estimate_watermarks(frames, plan):
+    """Estimate a WatermarkModel per area of plan from sampled frames
+
+    Areas get None if there are fewer than MIN_SAMPLES frames or no logo
+    was found in them.
+    """
+    regions = [[] for _ in plan.areas]
+    for frame in frames:
+        if frame.shape[:2] != plan.frame_shape:
+            continue
+        for area_regions, area_plan in zip(regions, plan.areas):
+            area_regions.append(frame[area_plan.outer].copy())
+
+    if not regions or len(regions[0]) < MIN_SAMPLES:
+        return [None] * len(plan.areas)
+    return [fit_watermark(area_regions, area_plan)
+            for area_regions, area_plan in zip(regions, plan.areas)]
+
+
+def regress_alpha(observed, guesses):
+    """Per-pixel alpha from the slope of observed values over background guesses"""
+    mean_observed = observed.mean(axis=0)
+    mean_guess = guesses.mean(axis=0)
+    deviation = guesses - mean_guess
+    covariance = (deviation * (observed - mean_observed)).mean(axis=0)
+    variance = (deviation * deviation).mean(axis=0)
+    slope = covariance / (variance + ALPHA_PRIOR)
+
+    # Alpha is shared by the colour channels
+    alpha = np.clip(1 - slope.mean(axis=2), 0, 1).astype(np.float32)
+    alpha = cv2.medianBlur(alpha, 3)
+    alpha[alpha < ALPHA_VISIBLE] = 0
+    return alpha, mean_observed, mean_guess
+
+
+def fit_watermark(regions, area_plan):
+    """WatermarkModel of one area from its sampled regions, None if no logo is visible"""
+    inner = area_plan.inner
+    observed = np.stack([region[inner] for region in regions]).astype(np.float32)
+    mask = area_plan.mask
+    kernel = np.ones((3, 3), dtype=np.uint8)
+    for _ in range(ALPHA_PASSES):
+        guesses = np.stack([laplace_fill(region, mask)[inner] for region in regions]).astype(np.float32)
+        alpha, mean_observed, mean_guess = regress_alpha(observed, guesses)
+        if not alpha.any():
+            return None
+        # The rest of the rectangle is real background, next guess only fills the strokes
+        mask = np.zeros_like(area_plan.mask)
+        mask[inner] = (alpha > 0).astype(np.uint8) * 255
+        mask = cv2.dilate(mask, kernel)
+
+    # Logo colour: alpha * W is what remains after the background share
+    colours = (mean_observed - (1 - alpha[:, :, np.newaxis]) * mean_guess) / \
+        np.maximum(alpha, ALPHA_VISIBLE)[:, :, np.newaxis]
+    confident = alpha > ALPHA_COLOUR
+    colour = np.median(colours[confident if confident.any() else alpha > 0], axis=0)
+    offset = alpha[:, :, np.newaxis] * np.clip(colour, 0, 255)
+    gain = 1 / (1 - np.minimum(alpha, ALPHA_OPAQUE))
+
+    opaque = None
+    if (alpha > ALPHA_OPAQUE).any():
+        # One pixel wider, edges of opaque strokes are the least reliable
+        opaque = np.zeros_like(area_plan.mask)
+        opaque[inner] = (alpha > ALPHA_OPAQUE).astype(np.uint8) * 255
+        opaque = cv2.dilate(opaque, kernel)
+    return WatermarkModel(alpha, gain[:, :, np.newaxis].astype(np.float32),
+                          offset.astype(np.float32), opaque)
+
+
+def unblend(region, model):
+    """Return watermark rectangle with the logo's blend inverted"""
+    restored = (region.astype(np.float32) - model.offset) * model.gain
+    return np.clip(restored + 0.5, 0, 255).astype(np.uint8)
@@ -0,0 +1,111 @@
+"""
+Content-addressed cache of processed watermark areas.
+
+Static stretches (slides, intros, end cards) feed identical pixels into the
+inpainting step frame after frame. The cache keys each area on a hash of its
+unprocessed pixels plus the settings fingerprint and, on a hit, blends the
+previously inpainted fill into the frame instead of inpainting again.
+"""
+import hashlib
+import threading
+import multiprocessing
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+# Counter slots in InpaintCache.counters
+HITS, MISSES, EVICTIONS = range(3)
+
+
+class InpaintCache:
+    """Bounded LRU cache of inpainted area fills
+
+    max_bytes bounds the stored pixel data. With tolerance > 0, an exact miss
+    is also compared with the source pixels of the same area's last fill and
+    that fill is reused if the mean absolute pixel difference is at most
+    tolerance (near-duplicates such as noisy static shots). Counters live in shared memory, so worker
+    processes that receive a copy of the cache report into the same totals;
+    each process keeps its own entries.
+    """
+
+    def __init__(self, max_bytes=64 * 2**20, tolerance=0.0):
+        self.max_bytes = int(max_bytes)
+        self.tolerance = float(tolerance)
+        self.counters = multiprocessing.Array("q", 3)
+        self._reset_entries()
+
+    def _reset_entries(self):
+        """Start with an empty store"""
+        self._entries = OrderedDict()
+        # Area key -> key of the last stored result (near-duplicate check)
+        self._latest = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Entries and lock stay in this process, copies start empty
+        return self.max_bytes, self.tolerance, self.counters
+
+    def __setstate__(self, state):
+        self.max_bytes, self.tolerance, self.counters = state
+        self._reset_entries()
+
+    def _count(self, slot):
+        """Increment shared counter"""
+        with self.counters.get_lock():
+            self.counters[slot] += 1
+
+    def stats(self):
+        """Return (hits, misses, evictions) since creation"""
+        with self.counters.get_lock():
+            return tuple(self.counters)
+
+    def lookup(self, area_plan, region, fingerprint):
+        """Look up unprocessed area pixels, return (token, cached fill or None)
+
+        Pass the token to store() with the inpainted pixels after a miss.
+        """
+        region = np.ascontiguousarray(region)
+        area_key = (area_plan.key, region.shape, fingerprint)
+        key = (area_key, hashlib.blake2b(region, digest_size=16).digest())
+        source = region.copy() if self.tolerance > 0 else None
+
+        with self._lock:
+            hit_key = key if key in self._entries else None
+            if hit_key is None and source is not None:
+                latest_key = self._latest.get(area_key)
+                if latest_key in self._entries and self._close(source, self._entries[latest_key][1]):
+                    hit_key = latest_key
+            entry = None
+            if hit_key is not None:
+                entry = self._entries[hit_key]
+                self._entries.move_to_end(hit_key)
+
+        if entry is None:
+            self._count(MISSES)
+            return (area_key, key, source), None
+        self._count(HITS)
+        return None, entry[0]
+
+    def _close(self, source, cached_source):
+        """Check whether two regions differ by at most tolerance per pixel"""
+        return cv2.norm(source, cached_source, cv2.NORM_L1) <= self.tolerance * source.size
+
+    def store(self, token, result):
+        """Store inpainted area pixels for a token returned by lookup()"""
+        area_key, key, source = token
+        entry = (result.copy(), source)
+        size = sum(array.nbytes for array in entry if array is not None)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = entry
+            self._latest[area_key] = key
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (old_result, old_source) = self._entries.popitem(last=False)
+                self._size -= old_result.nbytes + (old_source.nbytes if old_source is not None else 0)
+                self._count(EVICTIONS)
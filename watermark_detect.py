@@ -0,0 +1,134 @@
+"""
+Automatic watermark localisation.
+
+A watermark stays put while the picture behind it changes. Frames sampled
+across the video are shrunk, and the per-pixel median of their gradient
+magnitude is taken: edges of the video content move or vanish between
+samples and drop out of the median, the logo's edges are in every sample
+and stay. The persistent edges are closed into blobs, which give tight
+bounding boxes and a pixel mask of the logo footprint.
+
+Content that does not change for more than half of the samples persists
+as well. Straight edges spanning a large part of the frame (letterbox and
+pillarbox bars, test patterns) are removed before the blobs are formed, and
+blobs that span the frame, cover a large part of it or hold few edges (a
+static shot) are dropped with a warning.
+"""
+import logging
+import cv2
+import numpy as np
+
+# Width the samples are shrunk to before the statistics
+DETECT_WIDTH = 480
+# Median gradient magnitude (Sobel, 0-255 grey levels) that counts as persistent at least
+DETECT_MIN_GRADIENT = 40.0
+# Gap (pixels at detection width) between strokes that are still merged into one logo
+DETECT_GAP = 5
+# Blobs smaller than this (pixels at detection width) are ignored
+DETECT_MIN_AREA = 20
+# Extra border around boxes and mask, full-resolution pixels
+DETECT_PADDING = 4
+# Straight persistent edges longer than this share of the frame side are scene content
+DETECT_MAX_LINE = 1 / 3
+# Boxes reaching across this share of the frame width or height are scene content
+DETECT_MAX_SPAN = 0.9
+# Boxes larger than this share of the frame are scene content
+DETECT_MAX_FRACTION = 0.1
+# Least share of persistent edge pixels inside a blob (logos are dense in edges)
+DETECT_MIN_DENSITY = 0.15
+
+
+def gradient_magnitude(frame, size):
+    """Gradient magnitude of the grey, downscaled frame"""
+    gray = cv2.cvtColor(cv2.resize(frame, size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+    return cv2.magnitude(cv2.Sobel(gray, cv2.CV_32F, 1, 0), cv2.Sobel(gray, cv2.CV_32F, 0, 1))
+
+
+def persistent_edges(frames):
+    """Per-pixel median gradient magnitude of the samples, returns (median map, frame shape)"""
+    magnitudes = []
+    frame_shape = None
+    size = None
+    for frame in frames:
+        if frame_shape is None:
+            frame_shape = frame.shape[:2]
+            scale = min(1.0, DETECT_WIDTH / frame_shape[1])
+            size = (max(1, round(frame_shape[1] * scale)), max(1, round(frame_shape[0] * scale)))
+        elif frame.shape[:2] != frame_shape:
+            continue
+        magnitudes.append(gradient_magnitude(frame, size))
+    if not magnitudes:
+        return None, None
+    return np.median(np.stack(magnitudes), axis=0), frame_shape
+
+
+def detect_watermarks(frames):
+    """Find persistent overlays in sampled frames
+
+    Returns ([(x, y, w, h)] boxes in frame pixels, full-resolution uint8
+    mask of the logo footprints), ([], None) if nothing was found.
+    """
+    median, frame_shape = persistent_edges(frames)
+    if median is None:
+        return [], None
+
+    # Persistent edges stand out of the robust spread of the map
+    spread = 1.4826 * np.median(np.abs(median - np.median(median)))
+    threshold = max(DETECT_MIN_GRADIENT, np.median(median) + 6 * spread)
+    edges = (median > threshold).astype(np.uint8) * 255
+    edges = cv2.subtract(edges, long_lines(edges))
+
+    # Close the gaps between strokes and letters, fill the enclosed parts
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * DETECT_GAP + 1, 2 * DETECT_GAP + 1))
+    closed = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, kernel)
+    contours, _ = cv2.findContours(closed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    contours = [contour for contour in contours if cv2.contourArea(contour) >= DETECT_MIN_AREA]
+    small_mask = np.zeros_like(closed)
+    scale = frame_shape[1] / closed.shape[1]
+    for contour in contours:
+        blob = np.zeros_like(closed)
+        cv2.drawContours(blob, [contour], -1, 255, cv2.FILLED)
+        reason = scene_content(blob, edges)
+        if reason is not None:
+            x, y, w, h = (round(value * scale) for value in cv2.boundingRect(contour))
+            logging.warning(f"Persistent content at {(x, y, w, h)} ignored, {reason}")
+            continue
+        small_mask |= blob
+    if not small_mask.any():
+        return [], None
+
+    # Back to full resolution, padded so antialiased stroke edges are covered
+    height, width = frame_shape
+    mask = cv2.resize(small_mask, (width, height), interpolation=cv2.INTER_LINEAR)
+    mask = cv2.threshold(mask, 0, 255, cv2.THRESH_BINARY)[1]
+    padding = cv2.getStructuringElement(cv2.MORPH_RECT, (2 * DETECT_PADDING + 1, 2 * DETECT_PADDING + 1))
+    mask = cv2.dilate(mask, padding)
+
+    count, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+    boxes = [tuple(int(value) for value in stats[label, :4]) for label in range(1, count)]
+    return boxes, mask
+
+
+def long_lines(edges):
+    """Horizontal and vertical runs of edge pixels longer than DETECT_MAX_LINE of the frame side"""
+    height, width = edges.shape
+    lines = np.zeros_like(edges)
+    for size in ((max(1, round(width * DETECT_MAX_LINE)), 1), (1, max(1, round(height * DETECT_MAX_LINE)))):
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, size)
+        lines |= cv2.morphologyEx(edges, cv2.MORPH_OPEN, kernel)
+    # Antialiased bar edges are two or three pixels thick
+    return cv2.dilate(lines, np.ones((3, 3), dtype=np.uint8))
+
+
+def scene_content(blob, edges):
+    """Reason why a blob (filled uint8 mask) is not a logo, None if it may be one"""
+    height, width = blob.shape
+    x, y, w, h = cv2.boundingRect(blob)
+    if w >= DETECT_MAX_SPAN * width or h >= DETECT_MAX_SPAN * height:
+        return "spans the frame"
+    if w * h > DETECT_MAX_FRACTION * width * height:
+        return "covers too much of the frame"
+    area = np.count_nonzero(blob)
+    if np.count_nonzero(edges[blob > 0]) < DETECT_MIN_DENSITY * area:
+        return "too few edges for a logo"
+    return None
@@ -0,0 +1,1654 @@
+"""
+Headless watermark removal engine.
+
+Contains all video processing used by the GUI, without any Tk imports, so it
+can run on machines without a display. Can also be run from the command line:
+
+    python watermark_engine.py video.mp4 --areas areas.json
+    python watermark_engine.py *.mp4 --corner bottom_right --method telea
+"""
+import cv2
+import numpy as np
+import os
+import sys
+import copy
+import json
+import hashlib
+import logging
+import shutil
+import argparse
+import tempfile
+import threading
+import multiprocessing
+from collections import namedtuple, deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_EXCEPTION
+from watermark_cache import InpaintCache
+from watermark_temporal import TemporalFill
+from watermark_laplace import laplace_fill
+from watermark_patchmatch import PatchFields, patchmatch_fill
+from watermark_alpha import MIN_SAMPLES, estimate_watermarks, unblend
+from watermark_detect import detect_watermarks
+from watermark_track import AreaTracker
+from watermark_schedule import (AreaSchedule, TimeRange, area_time_ranges, ranges_to_json,
+                                add_time_ranges)
+from watermark_mask import (split_area_masks, masks_to_json, areas_from_json,
+                             polygon_mask, logo_mask)
+from watermark_scene import SceneContext, SceneDetector
+from watermark_pipeline import FramePipeline, ThreadWorkers, ProcessWorkers
+from watermark_io import (VIDEO_BACKENDS, ENCODER_PRESETS, open_reader, open_writer,
+                          probe_video, probe_keyframes, sample_frames, concat_segments,
+                          ffmpeg_available)
+
+CORNER_NAMES = ("bottom_right", "top_left", "bottom_left", "top_right")
+INPAINT_METHODS = ("mixed", "telea", "ns", "temporal", "laplace", "patchmatch")
+EXECUTION_MODES = ("thread", "process")
+COLOR_CORRECTION_SCOPES = ("frame", "areas")
+DENOISE_SCOPES = ("areas", "frame")
+SMOOTHING_FILTERS = ("bilateral", "guided")
+INPAINT_SCALES = (1, 2, 4, 8)
+OUTPUT_CODECS = ("mp4v", "h264", "xvid")
+
+DEFAULT_SETTINGS = {
+    "auto_detect": False,
+    "detect_samples": 40,
+    "track_areas": False,
+    "track_threshold": 0.5,
+    "inpaint_method": "mixed",
+    "blur_strength": 11,
+    "smoothing_filter": "bilateral",
+    "inpaint_scale": 1,
+    "inpaint_budget_ms": 40.0,
+    "alpha_unblend": False,
+    "alpha_samples": 30,
+    "margin_size": 20,
+    "merge_areas": True,
+    "denoise": False,
+    "denoise_scope": "areas",
+    "denoise_frames": 1,
+    "sharpen": False,
+    "color_correction": False,
+    "color_correction_scope": "frame",
+    "thread_count": 4,
+    "execution_mode": "thread",
+    "process_count": 0,
+    "use_hw_accel": True,
+    "use_buffering": True,
+    "max_in_flight": 16,
+    "output_codec": "mp4v",
+    "video_backend": "opencv",
+    "encoder_preset": "medium",
+    "encoder_crf": 23,
+    "encoder_threads": 0,
+    "copy_streams": True,
+    "segment_count": 1,
+    "cache_size_mb": 64,
+    "cache_tolerance": 0.0,
+    "temporal_threshold": 4.0,
+    "scene_threshold": 0.3,
+}
+
+# Settings that change output pixels (the rest only affect speed or container)
+PIXEL_SETTINGS = ("track_areas", "track_threshold", "inpaint_method", "inpaint_scale", "inpaint_budget_ms",
+                  "alpha_unblend", "alpha_samples",
+                  "blur_strength", "smoothing_filter", "margin_size", "merge_areas",
+                  "denoise", "denoise_scope", "denoise_frames",
+                  "sharpen", "color_correction", "color_correction_scope",
+                  "temporal_threshold", "scene_threshold")
+
+
+class ProcessingConfig(namedtuple("ProcessingConfig", list(DEFAULT_SETTINGS))):
+    """Immutable, hashable snapshot of processing settings, frozen once per job"""
+    __slots__ = ()
+
+    @classmethod
+    def from_settings(cls, settings=None):
+        """Build config from settings dict, missing values use defaults"""
+        if isinstance(settings, cls):
+            return settings
+        values = dict(DEFAULT_SETTINGS)
+        if settings:
+            values.update((key, value) for key, value in settings.items() if key in values)
+        # Normalize types so equal settings always give equal configs
+        for key, default in DEFAULT_SETTINGS.items():
+            values[key] = type(default)(values[key])
+        if values["inpaint_method"] not in INPAINT_METHODS:
+            raise ValueError(f"Unknown inpainting method: {values['inpaint_method']}")
+        if values["execution_mode"] not in EXECUTION_MODES:
+            raise ValueError(f"Unknown execution mode: {values['execution_mode']}")
+        if values["inpaint_scale"] not in (0,) + INPAINT_SCALES:
+            raise ValueError(f"Inpaint scale must be 0 (auto) or one of {INPAINT_SCALES}")
+        if values["detect_samples"] < 1:
+            raise ValueError(f"Invalid number of detection samples: {values['detect_samples']}")
+        if not 0 < values["track_threshold"] <= 1:
+            raise ValueError(f"Tracking threshold must be between 0 and 1: {values['track_threshold']}")
+        if values["alpha_samples"] < MIN_SAMPLES:
+            raise ValueError(f"Alpha un-blending needs at least {MIN_SAMPLES} samples")
+        if values["smoothing_filter"] not in SMOOTHING_FILTERS:
+            raise ValueError(f"Unknown smoothing filter: {values['smoothing_filter']}")
+        if values["denoise_scope"] not in DENOISE_SCOPES:
+            raise ValueError(f"Unknown denoise scope: {values['denoise_scope']}")
+        if values["denoise_frames"] < 1 or values["denoise_frames"] % 2 == 0:
+            raise ValueError(f"Denoise frames must be an odd number: {values['denoise_frames']}")
+        if values["color_correction_scope"] not in COLOR_CORRECTION_SCOPES:
+            raise ValueError(f"Unknown colour correction scope: {values['color_correction_scope']}")
+        if values["video_backend"] not in VIDEO_BACKENDS:
+            raise ValueError(f"Unknown video backend: {values['video_backend']}")
+        if values["encoder_preset"] not in ENCODER_PRESETS:
+            raise ValueError(f"Unknown encoder preset: {values['encoder_preset']}")
+        if values["max_in_flight"] < 1:
+            raise ValueError(f"In-flight window must be at least 1: {values['max_in_flight']}")
+        if values["segment_count"] < 0:
+            raise ValueError(f"Invalid segment count: {values['segment_count']}")
+        if values["scene_threshold"] > 1:
+            raise ValueError(f"Scene threshold must be between 0 and 1: {values['scene_threshold']}")
+        if values["cache_size_mb"] < 0 or values["cache_tolerance"] < 0:
+            raise ValueError("Cache size and tolerance must not be negative")
+        return cls(**values)
+
+    @property
+    def fingerprint(self):
+        """Key of settings that affect output pixels (for caching)"""
+        return tuple(getattr(self, name) for name in PIXEL_SETTINGS)
+
+
+def default_output_path(input_path, output_dir=None):
+    """Return output path for processed video"""
+    base, ext = os.path.splitext(os.path.basename(input_path))
+    if output_dir is None:
+        output_dir = os.path.dirname(os.path.abspath(input_path))
+    return os.path.join(output_dir, f"{base}_no_watermark{ext}")
+
+
+def save_areas_file(filepath, areas, corners, settings):
+    """Save areas, corners and settings to JSON file"""
+    data = {
+        "areas": [list(area[:4]) for area in areas],
+        "corners": {name: name in corners for name in CORNER_NAMES},
+        "settings": {
+            "auto_detect": settings.get("auto_detect", False),
+            "track_areas": settings.get("track_areas", False),
+            "inpaint_method": settings["inpaint_method"],
+            "blur_strength": settings["blur_strength"],
+            "smoothing_filter": settings.get("smoothing_filter", "bilateral"),
+            "margin_size": settings["margin_size"]
+        }
+    }
+    masks = masks_to_json(areas)
+    if masks is not None:
+        data["masks"] = masks
+    ranges = ranges_to_json(areas)
+    if ranges is not None:
+        data["ranges"] = ranges
+    with open(filepath, 'w') as f:
+        json.dump(data, f, indent=2)
+
+
+def load_areas_file(filepath):
+    """Load areas, corners and settings from JSON file
+
+    Areas with a pixel mask come back as (x, y, w, h, mask) tuples, areas
+    with a time range as (x, y, w, h, mask or None, TimeRange).
+    """
+    with open(filepath, 'r') as f:
+        data = json.load(f)
+
+    areas = add_time_ranges(areas_from_json(data.get("areas", []), data.get("masks")),
+                            data.get("ranges"))
+    corners_data = data.get("corners", {})
+    corners = [name for name in CORNER_NAMES if corners_data.get(name, False)]
+    settings = data.get("settings", {})
+    return areas, corners, settings
+
+
+def get_watermark_areas(frame, corners, custom_areas=()):
+    """Return watermark areas"""
+    height, width = frame.shape[:2]
+    watermark_areas = list(custom_areas)
+
+    if "bottom_right" in corners:
+        default_x = int(width * 0.75)
+        default_y = int(height * 0.75)
+        default_w = int(width * 0.25)
+        default_h = int(height * 0.25)
+        watermark_areas.append((default_x, default_y, default_w, default_h))
+
+    if "top_left" in corners:
+        default_x_top = 0
+        default_y_top = 0
+        default_w_top = int(width * 0.2)
+        default_h_top = int(height * 0.2)
+        watermark_areas.append((default_x_top, default_y_top, default_w_top, default_h_top))
+
+    if "bottom_left" in corners:
+        default_x_bottom = 0
+        default_y_bottom = int(height * 0.8)
+        default_w_bottom = int(width * 0.2)
+        default_h_bottom = int(height * 0.2)
+        watermark_areas.append((default_x_bottom, default_y_bottom, default_w_bottom, default_h_bottom))
+
+    if "top_right" in corners:
+        default_x_top_right = int(width * 0.8)
+        default_y_top_right = 0
+        default_w_top_right = int(width * 0.2)
+        default_h_top_right = int(height * 0.2)
+        watermark_areas.append((default_x_top_right, default_y_top_right, default_w_top_right, default_h_top_right))
+
+    return watermark_areas
+
+
+# Fixed-point blend weights: 8 fractional bits stored in uint16, so
+# 255 * ALPHA_ONE still fits and the whole blend stays in 16-bit integers
+ALPHA_SHIFT = 8
+ALPHA_ONE = 1 << ALPHA_SHIFT
+
+
+def gradient_blend_mask(area_shape, rect):
+    """Float blend mask (0..1): filled rectangle with blurred edges"""
+    x1, y1, x2, y2 = rect
+    blend_mask = np.zeros(area_shape, dtype=np.float32)
+    cv2.rectangle(blend_mask, (x1, y1), (x2, y2), 1.0, -1)
+    return cv2.GaussianBlur(blend_mask, (31, 31), 0)
+
+
+def alpha_to_fixed_point(blend_mask):
+    """Convert float blend mask (0..1) to 3-channel uint16 weights"""
+    alpha = np.rint(blend_mask * ALPHA_ONE).astype(np.uint16)
+    # Same layout as the image, so NumPy runs one contiguous loop per row
+    return np.repeat(alpha[:, :, np.newaxis], 3, axis=2)
+
+
+def blend_fixed_point(dst, src, alpha, inv_alpha):
+    """Blend src over dst in place, within 1 LSB of the float blend"""
+    acc = np.multiply(src, alpha, dtype=np.uint16)
+    tmp = np.multiply(dst, inv_alpha, dtype=np.uint16)
+    acc += tmp
+    acc >>= ALPHA_SHIFT
+    dst[...] = acc
+
+
+def blend_regions(alpha):
+    """Split weights into a fully opaque core and the strips that need blending
+
+    Returns (core, strips) as (rows, cols) slices; pixels outside both have
+    zero weight and are left untouched. Core is None if no opaque rectangle.
+    """
+    weight = alpha[:, :, 0]
+    rows = np.flatnonzero(weight.any(axis=1))
+    cols = np.flatnonzero(weight.any(axis=0))
+    if rows.size == 0:
+        return None, []
+    by1, by2, bx1, bx2 = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+
+    opaque = weight == ALPHA_ONE
+    opaque_rows = np.flatnonzero(opaque.any(axis=1))
+    opaque_cols = np.flatnonzero(opaque.any(axis=0))
+    if opaque_rows.size:
+        cy1, cy2 = opaque_rows[0], opaque_rows[-1] + 1
+        cx1, cx2 = opaque_cols[0], opaque_cols[-1] + 1
+        if opaque[cy1:cy2, cx1:cx2].all():
+            core = (slice(cy1, cy2), slice(cx1, cx2))
+            strips = [
+                (slice(by1, cy1), slice(bx1, bx2)),
+                (slice(cy2, by2), slice(bx1, bx2)),
+                (slice(cy1, cy2), slice(bx1, cx1)),
+                (slice(cy1, cy2), slice(cx2, bx2)),
+            ]
+            return core, [(ys, xs) for ys, xs in strips if ys.stop > ys.start and xs.stop > xs.start]
+    return None, [(slice(by1, by2), slice(bx1, bx2))]
+
+
+def blend_area(dst, src, area_plan):
+    """Blend inpainted area into dst: copy opaque core, blend only the soft edges"""
+    if area_plan.core is not None:
+        dst[area_plan.core] = src[area_plan.core]
+    for strip in area_plan.strips:
+        blend_fixed_point(dst[strip], src[strip], area_plan.alpha[strip], area_plan.inv_alpha[strip])
+
+
+def reflection_maps(mask):
+    """Remap tables that mirror each masked pixel across its nearest unmasked pixel
+
+    Returns (map_x, map_y) for cv2.remap, or None if nothing is unmasked.
+    Mirrored points that land in the mask or outside use the nearest pixel.
+    """
+    outside = np.flatnonzero(mask.ravel() == 0)
+    if outside.size == 0:
+        return None
+    # Labels number the unmasked pixels in raster order, starting at 1
+    _, labels = cv2.distanceTransformWithLabels(mask, cv2.DIST_L2, 5,
+                                                labelType=cv2.DIST_LABEL_PIXEL)
+    height, width = mask.shape
+    ys, xs = np.indices(mask.shape)
+    nearest = outside[labels - 1]
+    near_y, near_x = np.divmod(nearest, width)
+
+    mirror_y = np.clip(2 * near_y - ys, 0, height - 1)
+    mirror_x = np.clip(2 * near_x - xs, 0, width - 1)
+    inside = mask[mirror_y, mirror_x] > 0
+    mirror_y[inside] = near_y[inside]
+    mirror_x[inside] = near_x[inside]
+    return mirror_x.astype(np.float32), mirror_y.astype(np.float32)
+
+
+def outer_bounds(frame_shape, area, margin):
+    """(x1, y1, x2, y2) of area expanded by margin, clipped to the frame"""
+    x, y, w, h = area
+    height, width = frame_shape
+    return max(0, x - margin), max(0, y - margin), min(width, x + w + margin), min(height, y + h + margin)
+
+
+def box_pixels(box):
+    """Pixel count of (x1, y1, x2, y2), 0 if empty"""
+    return max(0, box[2] - box[0]) * max(0, box[3] - box[1])
+
+
+def merge_members(frame_shape, areas, area_masks, margin):
+    """Union area of overlapping areas: ((x, y, w, h), inpaint mask, blend weights)
+
+    The inpaint mask is the union of the members' masks. The blend weights
+    are the largest of the members' own weights, feathered edges included,
+    over the area grown by margin on every side (zero off the frame).
+    """
+    members = RegionPlan(frame_shape, areas, margin, area_masks).areas
+    if not members:
+        return None
+    oy1 = min(member.outer[0].start for member in members)
+    oy2 = max(member.outer[0].stop for member in members)
+    ox1 = min(member.outer[1].start for member in members)
+    ox2 = max(member.outer[1].stop for member in members)
+    mask = np.zeros((oy2 - oy1, ox2 - ox1), dtype=np.uint8)
+    weights = np.zeros((oy2 - oy1, ox2 - ox1), dtype=np.float32)
+    for member in members:
+        ys, xs = member.outer
+        region = (slice(ys.start - oy1, ys.stop - oy1), slice(xs.start - ox1, xs.stop - ox1))
+        np.maximum(mask[region], member.mask, out=mask[region])
+        np.maximum(weights[region], member.alpha[:, :, 0] / ALPHA_ONE, out=weights[region])
+
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    y1, y2, x1, x2 = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+    x, y, w, h = int(ox1 + x1), int(oy1 + y1), int(x2 - x1), int(y2 - y1)
+    blend = np.zeros((h + 2 * margin, w + 2 * margin), dtype=np.float32)
+    # Every member's weights lie within margin of the union of the masks
+    blend[oy1 - (y - margin):oy2 - (y - margin), ox1 - (x - margin):ox2 - (x - margin)] = weights
+    return (x, y, w, h), np.ascontiguousarray(mask[y1:y2, x1:x2]), blend
+
+
+def coalesce_areas(frame_shape, watermark_areas, area_masks, margin, time_ranges=None):
+    """Merge areas whose margin regions overlap into union areas with combined masks
+
+    Two areas are merged when the areas themselves overlap (their shared
+    pixels would be inpainted twice), or when their expanded regions overlap
+    or touch and the union's expanded bounding box is no larger than the two
+    regions together. Shared pixels are then read, inpainted and blended once
+    per frame. Areas with different time ranges are never merged. Returns
+    (areas, masks, blend weights, time ranges, (pixels read and blended,
+    pixels inpainted) saved per frame); blend weights are None for areas
+    that were not merged (see RegionPlan).
+    """
+    if time_ranges is None:
+        time_ranges = [None] * len(watermark_areas)
+    groups = [[i] for i in range(len(watermark_areas))]
+    boxes = [outer_bounds(frame_shape, area, margin) for area in watermark_areas]
+    # Per group, the (x1, y1, x2, y2) of its members
+    inner = [[outer_bounds(frame_shape, area, 0)] for area in watermark_areas]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(groups)):
+            for j in range(i + 1, len(groups)):
+                a, b = boxes[i], boxes[j]
+                if time_ranges[groups[i][0]] != time_ranges[groups[j][0]]:
+                    continue
+                if a[0] > b[2] or b[0] > a[2] or a[1] > b[3] or b[1] > a[3]:
+                    continue
+                union = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                if box_pixels(union) > box_pixels(a) + box_pixels(b) and not any(
+                        box_pixels((max(p[0], q[0]), max(p[1], q[1]), min(p[2], q[2]), min(p[3], q[3])))
+                        for p in inner[i] for q in inner[j]):
+                    continue
+                groups[i] += groups.pop(j)
+                boxes[i] = union
+                boxes.pop(j)
+                inner[i] += inner.pop(j)
+                merged = True
+                break
+            if merged:
+                break
+
+    areas = []
+    masks = []
+    blends = []
+    merged_ranges = []
+    for group in groups:
+        merged = None
+        if len(group) > 1:
+            merged = merge_members(frame_shape, [watermark_areas[i] for i in group],
+                                   [area_masks[i] for i in group], margin)
+        if merged is None:
+            areas += [watermark_areas[i] for i in group]
+            masks += [area_masks[i] for i in group]
+            blends += [None] * len(group)
+            merged_ranges += [time_ranges[i] for i in group]
+            continue
+        area, mask, blend = merged
+        areas.append(area)
+        masks.append(mask)
+        blends.append(blend)
+        merged_ranges.append(time_ranges[group[0]])
+
+    if len(areas) == len(watermark_areas):
+        return areas, masks, blends, merged_ranges, (0, 0)
+    before = RegionPlan(frame_shape, watermark_areas, margin, area_masks)
+    after = RegionPlan(frame_shape, areas, margin, masks, blends)
+    read = (sum(box_pixels(outer_bounds(frame_shape, area_plan.area, margin)) for area_plan in before.areas) -
+            sum(box_pixels(outer_bounds(frame_shape, area_plan.area, margin)) for area_plan in after.areas))
+    inpainted = (sum(np.count_nonzero(area_plan.mask) for area_plan in before.areas) -
+                 sum(np.count_nonzero(area_plan.mask) for area_plan in after.areas))
+    logging.info(f"Merged {len(watermark_areas)} areas into {len(areas)}: per frame {read} fewer "
+                 f"pixels read and blended, {inpainted} fewer inpainted")
+    return areas, masks, blends, merged_ranges, (read, inpainted)
+
+
+# Precomputed geometry of one area: outer/inner/core/strips slices are (rows, cols),
+# reflect holds the remap tables used to re-inject detail after pyramid inpainting,
+# key identifies area and mask across videos (same rectangle, other mask: other key)
+AreaPlan = namedtuple("AreaPlan", ["area", "outer", "inner", "mask", "alpha", "inv_alpha",
+                                   "core", "strips", "reflect", "key"])
+
+
+# Moved plans kept per RegionPlan (tracked areas)
+MOVED_PLANS = 64
+
+
+class RegionPlan:
+    """Masks, blend alphas and crop bounds of all areas, built once per video
+
+    area_masks optionally gives each area a uint8 mask of its rectangle's
+    size (None: whole rectangle); only its nonzero pixels are then filled,
+    and the fill is blended in with weight mask / 255. area_blends
+    optionally gives an area float blend weights (0..1) of its own, over
+    the area grown by margin on every side (merged areas, see
+    coalesce_areas); None: weights from the rectangle or mask.
+    """
+
+    def __init__(self, frame_shape, watermark_areas, margin, area_masks=None, area_blends=None):
+        self.frame_shape = tuple(frame_shape[:2])
+        self.margin = margin
+        # Downscale factor of pyramid inpainting, chosen per video by the engine
+        self.inpaint_scale = 1
+        # Per-area WatermarkModel (None: inpaint), estimated per video by the engine
+        self.watermarks = None
+        self.areas = []
+        # Masks and blend weights of the planned areas, for moved(), and their
+        # positions in watermark_areas
+        self.area_masks = []
+        self.area_blends = []
+        self.area_indices = []
+        self._moved = {}
+        self._lock = threading.Lock()
+        if area_masks is None:
+            area_masks = [None] * len(watermark_areas)
+        if area_blends is None:
+            area_blends = [None] * len(watermark_areas)
+        for index, (area, area_mask, area_blend) in enumerate(zip(watermark_areas, area_masks,
+                                                                  area_blends)):
+            area_plan = self._plan_area(tuple(area), area_mask, area_blend)
+            if area_plan is not None:
+                self.areas.append(area_plan)
+                self.area_masks.append(area_mask)
+                self.area_blends.append(area_blend)
+                self.area_indices.append(index)
+
+    def _plan_area(self, area, area_mask=None, area_blend=None):
+        """Precompute everything that does not depend on frame content"""
+        x, y, w, h = area
+        height, width = self.frame_shape
+        margin = self.margin
+        # Origin of area_blend in the frame
+        blend_x, blend_y = x - margin, y - margin
+        # Drawn shapes, typed coordinates and tracked logos may reach past the frame edges
+        left, top = max(0, x), max(0, y)
+        right, bottom = min(width, x + w), min(height, y + h)
+        if right <= left or bottom <= top:
+            logging.warning(f"Area {area} lies outside the frame, skipped")
+            return None
+        if area_mask is not None:
+            area_mask = area_mask[top - y:bottom - y, left - x:right - x]
+        x, y = left, top
+        h, w = area_mask.shape if area_mask is not None else (bottom - top, right - left)
+
+        # Expand analysis area
+        x1, y1 = max(0, x - margin), max(0, y - margin)
+        x2, y2 = min(width, x + w + margin), min(height, y + h + margin)
+        area_shape = (y2 - y1, x2 - x1)
+
+        # Create mask
+        mask = np.zeros(area_shape, dtype=np.uint8)
+        mask_x1 = x - x1
+        mask_y1 = y - y1
+        mask_x2 = mask_x1 + w
+        mask_y2 = mask_y1 + h
+        if area_mask is None:
+            cv2.rectangle(mask, (mask_x1, mask_y1), (mask_x2, mask_y2), 255, -1)
+            # Gradient blending weights
+            blend_mask = gradient_blend_mask(area_shape, (mask_x1, mask_y1, mask_x2, mask_y2))
+        else:
+            inner_mask = mask[mask_y1:mask_y2, mask_x1:mask_x2]
+            inner_mask[...] = area_mask[:inner_mask.shape[0], :inner_mask.shape[1]]
+            if not inner_mask.any():
+                logging.warning(f"Mask of area {area} is empty, skipped")
+                return None
+            # Fill and smoothing only change masked pixels, no feathering needed;
+            # soft masks are their own blend weights
+            blend_mask = mask.astype(np.float32) / 255
+            mask = cv2.threshold(mask, 0, 255, cv2.THRESH_BINARY)[1]
+        if area_blend is not None:
+            blend_mask = np.ascontiguousarray(
+                area_blend[y1 - blend_y:y2 - blend_y, x1 - blend_x:x2 - blend_x])
+        alpha = alpha_to_fixed_point(blend_mask)
+        core, strips = blend_regions(alpha)
+
+        return AreaPlan(
+            area=area,
+            outer=(slice(y1, y2), slice(x1, x2)),
+            inner=(slice(mask_y1, mask_y2), slice(mask_x1, mask_x2)),
+            mask=mask,
+            alpha=alpha,
+            inv_alpha=ALPHA_ONE - alpha,
+            core=core,
+            strips=strips,
+            reflect=reflection_maps(mask),
+            key=(area, hashlib.blake2b(alpha, digest_size=8).digest())
+        )
+
+    def matches(self, frame):
+        """Check whether plan was built for this frame size"""
+        return frame.shape[:2] == self.frame_shape
+
+    def moved(self, offsets):
+        """Plan with every area shifted by its (dx, dy) in offsets, built once per offsets
+
+        Tracked logos rest at a few positions, so the plans are kept and reused.
+        """
+        if not any(dx or dy for dx, dy in offsets):
+            return self
+        with self._lock:
+            plan = self._moved.get(offsets)
+        if plan is None:
+            areas = [(x + dx, y + dy, w, h)
+                     for (dx, dy), (x, y, w, h) in zip(offsets, (a.area for a in self.areas))]
+            plan = RegionPlan(self.frame_shape, areas, self.margin, self.area_masks, self.area_blends)
+            plan.inpaint_scale = self.inpaint_scale
+            with self._lock:
+                if len(self._moved) >= MOVED_PLANS:
+                    # Oldest first, dicts keep insertion order
+                    del self._moved[next(iter(self._moved))]
+                self._moved[offsets] = plan
+        return plan
+
+    def subset(self, indices):
+        """Plan of only the areas at indices, sharing their geometry (time-ranged areas)"""
+        if len(indices) == len(self.areas):
+            return self
+        plan = copy.copy(self)
+        plan.areas = [self.areas[i] for i in indices]
+        plan.area_masks = [self.area_masks[i] for i in indices]
+        plan.area_blends = [self.area_blends[i] for i in indices]
+        plan.area_indices = [self.area_indices[i] for i in indices]
+        if self.watermarks:
+            plan.watermarks = [self.watermarks[i] for i in indices]
+        plan._moved = {}
+        plan._lock = threading.Lock()
+        return plan
+
+    def __getstate__(self):
+        # Worker processes rebuild their own moved plans
+        state = dict(self.__dict__, _moved={})
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+# Grey-level standard deviation above which "mixed" treats an area as textured
+TEXTURE_THRESHOLD = 30
+
+
+def is_textured(working_area):
+    """Texture analysis used by the "mixed" method"""
+    gray = cv2.cvtColor(working_area, cv2.COLOR_BGR2GRAY)
+    return np.std(gray) > TEXTURE_THRESHOLD
+
+
+def inpaint_area(working_area, mask, method, textured=None, patch_fill=None):
+    """Inpaint masked pixels of working area
+
+    textured: "mixed" decision made for the whole scene, analysed per call if None.
+    patch_fill: PatchFields.area_fill() of the area, "patchmatch" then starts
+    from the previous frame's nearest-neighbour field instead of solving cold.
+    """
+    if method in ("telea", "temporal"):
+        # temporal only inpaints when its background model is rebuilt
+        return cv2.inpaint(working_area, mask, 7, cv2.INPAINT_TELEA)
+    if method == "ns":
+        return cv2.inpaint(working_area, mask, 7, cv2.INPAINT_NS)
+    if method == "laplace":
+        return laplace_fill(working_area, mask)
+    if method == "patchmatch":
+        if patch_fill is not None:
+            return patch_fill(working_area, mask)
+        return patchmatch_fill(working_area, mask)[0]
+
+    # mixed: texture analysis
+    if textured is None:
+        textured = is_textured(working_area)
+
+    if textured:
+        return cv2.inpaint(working_area, mask, 7, cv2.INPAINT_TELEA)
+    inpainted_ns = cv2.inpaint(working_area, mask, 7, cv2.INPAINT_NS)
+    inpainted_telea = cv2.inpaint(working_area, mask, 7, cv2.INPAINT_TELEA)
+    return cv2.addWeighted(inpainted_ns, 0.5, inpainted_telea, 0.5, 0)
+
+
+# Guided filter tuned to look like bilateralFilter(d, sigmaColor=100, sigmaSpace=100):
+# box radius d / 4, regularization on the 0..1 intensity scale
+GUIDED_RADIUS_DIVISOR = 4
+GUIDED_EPS = 0.006
+
+
+def guided_filter(image, radius, eps=GUIDED_EPS):
+    """Self-guided edge-preserving smoothing (He et al.), per channel
+
+    Built from box filters only, so the cost per pixel does not depend on radius.
+    """
+    ksize = (2 * radius + 1, 2 * radius + 1)
+    guide = image.astype(np.float32)
+    guide *= 1.0 / 255
+
+    mean = cv2.boxFilter(guide, -1, ksize)
+    var = cv2.boxFilter(cv2.multiply(guide, guide), -1, ksize)
+    var -= cv2.multiply(mean, mean)
+
+    # Linear model per window: output = a * guide + b
+    a = cv2.divide(var, var + eps)
+    b = mean
+    b -= cv2.multiply(a, mean)
+
+    result = cv2.multiply(cv2.boxFilter(a, -1, ksize), guide)
+    result += cv2.boxFilter(b, -1, ksize)
+    return cv2.convertScaleAbs(result, alpha=255)
+
+
+def smooth_area(roi, config):
+    """Edge-preserving blur of the filled rectangle"""
+    if config.smoothing_filter == "guided":
+        return guided_filter(roi, max(1, config.blur_strength // GUIDED_RADIUS_DIVISOR))
+    return cv2.bilateralFilter(roi, d=config.blur_strength, sigmaColor=100, sigmaSpace=100)
+
+
+# Full-resolution band refined along the mask border, per pyramid scale step
+PYRAMID_BAND = 2
+# Inpainting time per masked pixel (microseconds, one core, smooth 160x160 area);
+# "mixed" pays for both of its inpaints, the worst case
+INPAINT_COST_US = {"mixed": 9.0, "telea": 6.3, "ns": 5.8, "temporal": 3.5,
+                   "laplace": 0.2, "patchmatch": 15.0}
+
+
+def pyramid_inpaint(working_area, area_plan, method, scale, textured=None, patch_fill=None):
+    """Inpaint at 1/scale resolution, then restore detail and the border at full resolution
+
+    The coarse fill is upsampled, high frequencies lost by downscaling are
+    mirrored in from the unmasked surroundings, and a thin band along the
+    mask border is inpainted again at full resolution (Telea).
+    """
+    height, width = working_area.shape[:2]
+    small_size = (max(1, width // scale), max(1, height // scale))
+    small = cv2.resize(working_area, small_size, interpolation=cv2.INTER_AREA)
+    # Small pixel is masked if any of its source pixels is
+    small_mask = cv2.resize(area_plan.mask, small_size, interpolation=cv2.INTER_AREA)
+    small_mask = cv2.threshold(small_mask, 0, 255, cv2.THRESH_BINARY)[1]
+
+    filled = inpaint_area(small, small_mask, method, textured, patch_fill)
+    upsampled = cv2.resize(filled, (width, height), interpolation=cv2.INTER_LINEAR)
+
+    if area_plan.reflect is not None:
+        # Detail lost by the pyramid level, mirrored into the masked pixels
+        base = cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+        detail = cv2.subtract(working_area, base, dtype=cv2.CV_16S)
+        detail = cv2.remap(detail, area_plan.reflect[0], area_plan.reflect[1], cv2.INTER_NEAREST)
+        upsampled = cv2.add(upsampled, detail, dtype=cv2.CV_8U)
+
+    result = working_area.copy()
+    cv2.copyTo(upsampled, area_plan.mask, result)
+
+    # Border band at full resolution, the coarse fill inside counts as known
+    band_width = PYRAMID_BAND * scale
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2 * band_width + 1, 2 * band_width + 1))
+    band = cv2.subtract(area_plan.mask, cv2.erode(area_plan.mask, kernel))
+    return cv2.inpaint(result, band, 3, cv2.INPAINT_TELEA)
+
+
+def choose_inpaint_scale(plan, config):
+    """Smallest pyramid scale whose estimated inpainting time fits the frame budget
+
+    The estimate depends only on the masked pixel count and the method, so
+    every run and every segment of a video gets the same scale.
+    """
+    if config.inpaint_scale > 0:
+        return config.inpaint_scale
+    masked = sum(np.count_nonzero(area_plan.mask) for area_plan in plan.areas)
+    if masked == 0:
+        return 1
+    cost = INPAINT_COST_US[config.inpaint_method] / 1e6
+    budget = config.inpaint_budget_ms / 1000.0
+    for scale in INPAINT_SCALES:
+        if masked / scale ** 2 * cost <= budget:
+            return scale
+    return INPAINT_SCALES[-1]
+
+
+def fill_area(working_area, area_plan, config, textured=None, scale=1, patch_fill=None):
+    """Inpaint area and smooth the filled rectangle, returns new array"""
+    if scale > 1:
+        inpainted = pyramid_inpaint(working_area, area_plan, config.inpaint_method, scale,
+                                    textured, patch_fill)
+    else:
+        inpainted = inpaint_area(working_area, area_plan.mask, config.inpaint_method,
+                                 textured, patch_fill)
+
+    # Additional blur on watermark area (patch fill copies real texture, keep it sharp)
+    if config.blur_strength > 1 and config.inpaint_method != "patchmatch":
+        inner = inpainted[area_plan.inner]
+        np.copyto(inner, smooth_area(inner, config),
+                  where=area_plan.mask[area_plan.inner][:, :, np.newaxis] > 0)
+
+    return inpainted
+
+
+def remove_watermark_advanced(frame, plan, config, cache=None, temporal=None, scene=None):
+    """Advanced watermark removal method, modifies frame in place
+
+    temporal: state carried between frames, TemporalFill with background models
+    for the "temporal" method, PatchFields with nearest-neighbour fields for "patchmatch".
+    scene: SceneContext with per-scene decisions, None to decide per frame.
+    """
+    if not isinstance(plan, RegionPlan):
+        plan = RegionPlan(frame.shape, plan, config.margin_size)
+    if config.inpaint_method == "temporal":
+        if temporal is None:
+            temporal = TemporalFill(config.temporal_threshold)
+        # Fill depends on earlier frames, not only on the area's pixels
+        cache = None
+
+    scale = config.inpaint_scale or plan.inpaint_scale
+
+    for i, area_plan in enumerate(plan.areas):
+        # Working area is a view into the decoded frame, no copy
+        working_area = frame[area_plan.outer]
+        textured = scene.textured[i] if scene is not None and scene.textured else None
+
+        model = plan.watermarks[i] if plan.watermarks else None
+        if model is not None:
+            # Translucent logo: invert the blend, only opaque pixels are inpainted.
+            # Written directly, the gradient blend would mix the logo back in.
+            working_area[area_plan.inner] = unblend(working_area[area_plan.inner], model)
+            if model.opaque is not None:
+                working_area[...] = inpaint_area(working_area, model.opaque,
+                                                 config.inpaint_method, textured)
+            continue
+
+        if config.inpaint_method == "temporal":
+            inpainted = temporal.fill(area_plan, working_area,
+                                      lambda region: fill_area(region, area_plan, config,
+                                                               scale=scale),
+                                      scene.index if scene is not None else None)
+            blend_area(working_area, inpainted, area_plan)
+            continue
+
+        # Same pixels as an earlier frame: reuse its fill, blended into this frame
+        # (the margin keeps this frame's pixels, content may move through it)
+        if cache is not None:
+            token, cached = cache.lookup(area_plan, working_area, (config.fingerprint, textured))
+            if cached is not None:
+                blend_area(working_area, cached, area_plan)
+                continue
+
+        patch_fill = None
+        if config.inpaint_method == "patchmatch" and temporal is not None:
+            patch_fill = temporal.area_fill(area_plan.area, scene.index if scene is not None else None)
+
+        inpainted = fill_area(working_area, area_plan, config, textured, scale, patch_fill)
+
+        if cache is not None:
+            cache.store(token, inpainted)
+
+        # Blend straight back into the frame
+        blend_area(working_area, inpainted, area_plan)
+
+    return frame
+
+
+# Frames between colour histogram samples within a scene, and how much each
+# sample moves the curve (exponential smoothing, no brightness flicker)
+COLOR_SAMPLE_INTERVAL = 10
+COLOR_SMOOTHING = 0.2
+
+
+def luma_histogram(frame, step=4):
+    """Luma (Y of YCrCb) histogram of every step-th pixel in both directions"""
+    ycrcb = cv2.cvtColor(np.ascontiguousarray(frame[::step, ::step]), cv2.COLOR_BGR2YCrCb)
+    return cv2.calcHist([ycrcb], [0], None, [256], [0, 256]).ravel()
+
+
+def equalization_curve(hist):
+    """Float mapping 0..255 that equalizes a 256-bin histogram (as cv2.equalizeHist)"""
+    nonzero = np.flatnonzero(hist)
+    if nonzero.size == 0:
+        return np.arange(256, dtype=np.float64)
+    first = nonzero[0]
+    total = hist.sum()
+    curve = np.zeros(256, dtype=np.float64)
+    if hist[first] == total:
+        curve[:] = first
+        return curve
+    cdf = np.cumsum(hist) - hist[first]
+    curve[first:] = cdf[first:] * (255.0 / (total - hist[first]))
+    return curve
+
+
+def curve_to_lut(curve):
+    """Round float mapping to a uint8 lookup table"""
+    return np.clip(np.rint(curve), 0, 255).astype(np.uint8)
+
+
+class SceneAnalyzer:
+    """Per-scene decisions, fed every decoded frame in order on the reader thread
+
+    Called as frame_args(index, frame) of FramePipeline, returns the frame's
+    SceneContext. Without scene detection the whole video is one scene.
+    """
+
+    def __init__(self, plan, config):
+        self.plan = plan
+        self.config = config
+        self.detector = None
+        if config.scene_threshold > 0:
+            self.detector = SceneDetector(config.scene_threshold)
+        self.scene_count = 0
+        self.context = None
+        self.curve = None
+        self.frames_in_scene = 0
+
+    def __call__(self, index, frame):
+        if self.detector is not None:
+            cut = self.detector.is_cut(frame)
+        else:
+            cut = self.context is None
+
+        if cut:
+            self.context = self.new_scene(frame)
+            self.frames_in_scene = 0
+        elif (self.config.color_correction and self.detector is not None
+              and self.frames_in_scene % COLOR_SAMPLE_INTERVAL == 0):
+            # Smooth the curve towards the current frame; without scene
+            # detection the first frame's curve is kept for the whole video
+            target = equalization_curve(luma_histogram(frame))
+            self.curve += COLOR_SMOOTHING * (target - self.curve)
+            self.context = self.context._replace(lut=curve_to_lut(self.curve))
+        self.frames_in_scene += 1
+        return (self.context,)
+
+    def new_scene(self, frame):
+        """Make decisions from the first frame of a scene"""
+        textured = ()
+        if self.config.inpaint_method == "mixed" and self.detector is not None:
+            textured = tuple(bool(is_textured(frame[area_plan.outer]))
+                             for area_plan in self.plan.areas)
+
+        lut = None
+        if self.config.color_correction:
+            self.curve = equalization_curve(luma_histogram(frame))
+            lut = curve_to_lut(self.curve)
+
+        self.scene_count += 1
+        return SceneContext(index=self.scene_count - 1, textured=textured, lut=lut)
+
+
+def correct_lightness(image, lut):
+    """Map the luma of a BGR image through lut, chroma (Cr, Cb) is kept
+
+    YCrCb is a linear transform, several times cheaper than LAB both ways.
+    """
+    ycrcb = cv2.cvtColor(image, cv2.COLOR_BGR2YCrCb)
+    ycrcb[:, :, 0] = cv2.LUT(ycrcb[:, :, 0], lut)
+    return cv2.cvtColor(ycrcb, cv2.COLOR_YCrCb2BGR)
+
+
+def apply_color_correction(frame, lut, plan=None):
+    """Apply colour-correction LUT in place, to the whole frame or only inside plan's areas"""
+    if plan is None:
+        frame[...] = correct_lightness(frame, lut)
+        return frame
+
+    for area_plan in plan.areas:
+        # Soft edges of the area blend the corrected pixels in
+        region = frame[area_plan.outer]
+        blend_area(region, correct_lightness(region, lut), area_plan)
+    return frame
+
+
+# NL-means strength and window sizes (luma h, colour h, template, search)
+DENOISE_PARAMS = (10, 10, 7, 21)
+
+
+def denoise_frame(frames, center, plan=None):
+    """NL-means denoise frames[center] in place using all given frames (odd count)
+
+    With plan, only the areas are denoised: each area plus its margin is
+    filtered and blended into the watermark rectangle through its soft edges.
+    """
+    h, h_color, template, search = DENOISE_PARAMS
+
+    def denoise(images):
+        if len(images) == 1:
+            return cv2.fastNlMeansDenoisingColored(images[0], None, h, h_color, template, search)
+        return cv2.fastNlMeansDenoisingColoredMulti(images, center, len(images),
+                                                    None, h, h_color, template, search)
+
+    frame = frames[center]
+    if plan is None:
+        frame[...] = denoise(list(frames))
+        return frame
+
+    for area_plan in plan.areas:
+        crops = [np.ascontiguousarray(f[area_plan.outer]) for f in frames]
+        blend_area(frame[area_plan.outer], denoise(crops), area_plan)
+    return frame
+
+
+class TemporalDenoiser:
+    """Multi-frame NL-means on processed frames, fed in frame order on the writer thread
+
+    Frames are held back by half the window so every frame is denoised with
+    its neighbours on both sides (fewer at the start and end of the video).
+    write(frame) receives the denoised frames in order.
+    """
+
+    def __init__(self, write, plan, config):
+        self.write = write
+        self.plan = plan
+        self.areas_only = config.denoise_scope == "areas"
+        self.radius = config.denoise_frames // 2
+        self.frames = deque()
+        # Areas of each held frame (tracked logos move), parallel to self.frames
+        self.plans = deque()
+        # Number of frames before self.frames[0] and of frames already written
+        self.start = 0
+        self.written = 0
+
+    def push(self, frame, plan=None):
+        """Add processed frame (copied, the caller may reuse its buffer)
+
+        plan: the frame's own areas, None for the plan given at creation.
+        """
+        self.frames.append(frame.copy())
+        self.plans.append(plan if plan is not None else self.plan)
+        while self.start + len(self.frames) - self.written > self.radius:
+            self._write_next()
+
+    def flush(self):
+        """Denoise and write the frames still held back"""
+        while self.written < self.start + len(self.frames):
+            self._write_next()
+
+    def _write_next(self):
+        """Denoise next frame with a symmetric window, write it and drop old frames"""
+        position = self.written - self.start
+        after = len(self.frames) - position - 1
+        radius = min(self.radius, position, after)
+        window = [self.frames[i] for i in range(position - radius, position + radius + 1)]
+        plan = self.plans[position] if self.areas_only else None
+        self.write(denoise_frame(window, radius, plan))
+        self.written += 1
+        while self.written - self.start > self.radius:
+            self.frames.popleft()
+            self.plans.popleft()
+            self.start += 1
+
+
+def apply_post_processing(frame, config, scene=None, plan=None):
+    """Apply post-processing, returns new frame only if sharpen is enabled
+
+    plan: areas for denoise_scope / color_correction_scope "areas".
+    Multi-frame denoising runs later, in TemporalDenoiser.
+    """
+    result = frame
+
+    if config.denoise and config.denoise_frames == 1:
+        result = denoise_frame([result], 0, plan if config.denoise_scope == "areas" else None)
+
+    if config.sharpen:
+        kernel = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])
+        result = cv2.filter2D(result, -1, kernel)
+
+    if config.color_correction:
+        # Lightness lookup with the scene's smoothed curve
+        if scene is not None and scene.lut is not None:
+            lut = scene.lut
+        else:
+            lut = curve_to_lut(equalization_curve(luma_histogram(result)))
+        scope_plan = plan if config.color_correction_scope == "areas" else None
+        result = apply_color_correction(result, lut, scope_plan)
+
+    return result
+
+
+def changes_whole_frame(config):
+    """Check whether post-processing changes pixels outside the areas"""
+    return (config.sharpen or (config.denoise and config.denoise_scope == "frame") or
+            (config.color_correction and config.color_correction_scope == "frame"))
+
+
+# Extra full-frame buffers alive at the peak of each post-processing filter
+POST_PROCESSING_FRAMES = {"denoise": 1, "sharpen": 2, "color_correction": 0}
+
+
+def estimate_frame_memory(plan, config):
+    """Estimate peak bytes held by one in-flight frame (excluding the shared plan)"""
+    height, width = plan.frame_shape
+    frame_bytes = height * width * 3
+
+    # Areas are processed one after another, so the largest one sets the peak
+    area_bytes = 0
+    inpaint_results = 3 if config.inpaint_method == "mixed" else 1
+    for area_plan in plan.areas:
+        pixels = area_plan.mask.size * 3
+        # uint8 inpaint results plus two uint16 blend temporaries
+        area_bytes = max(area_bytes, pixels * (inpaint_results + 2 * 2))
+
+    post_frames = max([count for name, count in POST_PROCESSING_FRAMES.items()
+                       if getattr(config, name)] or [0])
+
+    return frame_bytes + max(area_bytes, post_frames * frame_bytes)
+
+
+def process_single_frame(frame, plan, config, cache=None, temporal=None, scene=None, offsets=None,
+                         active=None):
+    """Process single frame
+
+    offsets: per-area (dx, dy) of tracked areas.
+    active: indices of the areas active in this frame, None for all.
+    """
+    if offsets is not None:
+        plan = plan.moved(offsets)
+    if active is not None:
+        plan = plan.subset(active)
+        if scene is not None and scene.textured:
+            scene = scene._replace(textured=tuple(scene.textured[i] for i in active))
+
+    # Remove watermark
+    processed = remove_watermark_advanced(frame, plan, config, cache, temporal, scene)
+
+    # Apply post-processing
+    processed = apply_post_processing(processed, config, scene, plan)
+
+    return processed
+
+
+def init_worker_process():
+    """Keep OpenCV single-threaded inside worker processes (one process per core)"""
+    cv2.setNumThreads(1)
+
+
+def plan_segments(keyframes, total_frames, count):
+    """Split frames 0..total_frames into up to count ranges starting at keyframes
+
+    Returns [(start, stop)], stop of the last range is None (read to the end).
+    """
+    cuts = set()
+    for i in range(1, count):
+        target = i * total_frames / count
+        cut = min(keyframes, key=lambda keyframe: abs(keyframe - target))
+        if 0 < cut < total_frames:
+            cuts.add(cut)
+    starts = [0] + sorted(cuts)
+    return list(zip(starts, starts[1:] + [None]))
+
+
+def process_segment(input_path, output_path, corners, custom_areas, areas, config,
+                    start_frame, stop_frame, index, progress, cancel_event):
+    """Process one segment in a worker process, report frames done in progress[index]
+
+    Returns (frame count, cache stats of the segment).
+    """
+    init_worker_process()
+
+    def on_progress(done, total):
+        progress[index] = done
+
+    engine = WatermarkEngine(config, custom_areas, progress_callback=on_progress,
+                             cancel_check=cancel_event.is_set)
+    frame_limit = None if stop_frame is None else stop_frame - start_frame
+    frame_count = engine.process_range(input_path, output_path, corners, start_frame, frame_limit,
+                                       areas)
+    return frame_count, engine.cache_stats
+
+
+class WatermarkEngine:
+    """Video processing engine shared by the GUI and the command line"""
+
+    def __init__(self, settings=None, custom_areas=(), progress_callback=None,
+                 preview_callback=None, preview_frequency=30, cancel_check=None):
+        # Frozen once, workers never read mutable (or Tk) state
+        self.config = ProcessingConfig.from_settings(settings)
+        self.custom_areas = list(custom_areas)
+        self.progress_callback = progress_callback
+        self.preview_callback = preview_callback
+        self.preview_frequency = preview_frequency
+        self.cancel_check = cancel_check
+        self.cancelled = False
+        self.frame_memory = 0
+        # Kept across jobs, so repeated intros and end cards hit in later files too
+        self.cache = None
+        if self.config.cache_size_mb > 0:
+            self.cache = InpaintCache(self.config.cache_size_mb * 2**20, self.config.cache_tolerance)
+        self.cache_stats = (0, 0, 0)
+
+    def is_cancelled(self):
+        """Check whether processing was cancelled"""
+        if self.cancel_check is not None and self.cancel_check():
+            self.cancelled = True
+        return self.cancelled
+
+    def cancel(self):
+        """Cancel processing"""
+        self.cancelled = True
+
+    def worker_process_count(self):
+        """Number of worker processes in process mode"""
+        return self.config.process_count or os.cpu_count() or 1
+
+    def pipeline_window(self):
+        """Frames allowed between decoding and encoding"""
+        window = self.config.max_in_flight if self.config.use_buffering else 1
+        if self.config.execution_mode == "process":
+            # Two frames per worker process: one being processed, one queued
+            min_window = 2 * self.worker_process_count()
+            if window < min_window:
+                logging.info(f"In-flight window raised from {window} to {min_window} "
+                             f"to keep all worker processes busy")
+                window = min_window
+        return window
+
+    def create_workers(self, plan, frame_shape, window):
+        """Create frame worker pool for the configured execution mode"""
+        # Background models and patch fields start empty for every video
+        temporal = None
+        if self.config.inpaint_method == "temporal":
+            temporal = TemporalFill(self.config.temporal_threshold)
+        elif self.config.inpaint_method == "patchmatch":
+            temporal = PatchFields()
+        args = (plan, self.config, self.cache, temporal)
+        if self.config.execution_mode == "process":
+            process_count = self.worker_process_count()
+            logging.info(f"Using {process_count} worker processes, {window} shared-memory slots")
+            return ProcessWorkers(process_single_frame, args, frame_shape, window,
+                                  max_workers=process_count, initializer=init_worker_process)
+        return ThreadWorkers(process_single_frame, args, max_workers=self.config.thread_count)
+
+    def process_video(self, input_path, output_path, corners):
+        """Process video file, return number of processed frames"""
+        if self.config.segment_count != 1:
+            return self.process_video_segments(input_path, output_path, corners)
+        return self.process_range(input_path, output_path, corners)
+
+    def resolve_areas(self, input_path, first_frame, corners):
+        """Plan the video's areas, returns (RegionPlan, time range of every area)
+
+        Detection and alpha estimation sample the whole video, segment mode
+        resolves them once and hands the result to every segment.
+        """
+        all_areas = get_watermark_areas(first_frame, corners, self.custom_areas)
+        watermark_areas, area_masks = split_area_masks(all_areas)
+        time_ranges = area_time_ranges(all_areas)
+        if self.config.auto_detect:
+            # Detected areas only fill the logo footprint, not the whole box
+            boxes, mask = detect_watermarks(sample_frames(input_path, self.config.detect_samples))
+            if boxes:
+                logging.info(f"Detected watermark areas: {boxes}")
+            else:
+                logging.warning("No persistent watermark detected")
+            watermark_areas += boxes
+            area_masks += [mask[y:y + h, x:x + w] for x, y, w, h in boxes]
+            time_ranges += [None] * len(boxes)
+        area_blends = None
+        if self.config.merge_areas:
+            watermark_areas, area_masks, area_blends, time_ranges, _ = coalesce_areas(
+                first_frame.shape[:2], watermark_areas, area_masks, self.config.margin_size,
+                time_ranges)
+        plan = RegionPlan(first_frame.shape, watermark_areas, self.config.margin_size, area_masks,
+                          area_blends)
+        plan.inpaint_scale = choose_inpaint_scale(plan, self.config)
+        if plan.inpaint_scale > 1:
+            logging.info(f"Pyramid inpainting at 1/{plan.inpaint_scale} resolution")
+        if self.config.alpha_unblend and self.config.track_areas:
+            logging.warning("Alpha un-blending needs a logo that does not move, "
+                            "disabled while tracking")
+        elif self.config.alpha_unblend:
+            plan.watermarks = estimate_watermarks(
+                sample_frames(input_path, self.config.alpha_samples), plan)
+            found = sum(model is not None for model in plan.watermarks)
+            logging.info(f"Alpha un-blending: translucent logo found in {found} of "
+                         f"{len(plan.areas)} areas")
+
+        return plan, time_ranges
+
+    def process_range(self, input_path, output_path, corners, start_frame=0, frame_limit=None,
+                      areas=None):
+        """Process frames from start_frame (a keyframe) in one pass, at most frame_limit of them
+
+        areas is a resolve_areas() result, resolved from this range's first frame when None.
+        """
+        reader = None
+        writer = None
+        try:
+            # Frames allowed between decoding and encoding
+            window = self.pipeline_window()
+
+            # Reader buffers: the in-flight window plus frames held by the reader stage
+            reader = open_reader(input_path, self.config, buffers=window + 2,
+                                 start_frame=start_frame)
+
+            # Get video parameters
+            width, height, fps = reader.width, reader.height, reader.fps
+            total_frames = reader.frame_count - start_frame
+            if frame_limit is not None:
+                total_frames = min(total_frames, frame_limit)
+
+            if total_frames <= 0:
+                raise Exception("Video contains no frames or is corrupted.")
+
+            logging.info(f"Video: {width}x{height}, {fps} FPS, {total_frames} frames")
+
+            # Create writer
+            # Audio, subtitles and metadata are stream-copied from the input
+            source_path = input_path if self.config.copy_streams else None
+            writer = open_writer(output_path, self.config, fps, (width, height), source_path)
+
+            # Get watermark areas from first frame
+            first_frame = reader.read()
+            if first_frame is None:
+                raise Exception("Cannot read first frame.")
+
+            if areas is None:
+                areas = self.resolve_areas(input_path, first_frame, corners)
+            plan, time_ranges = areas
+
+            self.frame_memory = estimate_frame_memory(plan, self.config)
+            logging.info(f"Peak memory per in-flight frame: {self.frame_memory / 2**20:.2f} MB, "
+                         f"{window} in flight: {window * self.frame_memory / 2**20:.2f} MB")
+
+            # First frame was already decoded, feed it to the pipeline before the rest
+            pending_first = [first_frame]
+            frames_read = [0]
+
+            def read_frame():
+                if frame_limit is not None and frames_read[0] >= frame_limit:
+                    return None
+                frames_read[0] += 1
+                if pending_first:
+                    return pending_first.pop()
+                return reader.read()
+
+            # Multi-frame denoising needs processed neighbours, so it runs in frame order here
+            denoiser = None
+            if self.config.denoise and self.config.denoise_frames > 1:
+                denoiser = TemporalDenoiser(writer.write, plan, self.config)
+            # Each frame's plan (moved by tracking, active areas), set on the reader thread and
+            # taken by the writer thread; single dict operations are atomic
+            frame_plans = {}
+
+            def write_frame(index, frame):
+                if denoiser is not None:
+                    denoiser.push(frame, frame_plans.pop(index))
+                else:
+                    writer.write(frame)
+
+                # Update preview
+                if self.preview_callback and index % self.preview_frequency == 0:
+                    self.preview_callback(frame, index, total_frames)
+
+                # Update progress
+                if self.progress_callback:
+                    self.progress_callback(index + 1, total_frames)
+
+            # Scene cuts and per-scene decisions on the reader thread, in frame order
+            scenes = SceneAnalyzer(plan, self.config)
+            tracker = None
+            if self.config.track_areas:
+                # Template from the video's first frame, later segments start elsewhere
+                template_frame = first_frame
+                if start_frame > 0:
+                    template_frame = next(sample_frames(input_path, 1), first_frame)
+                tracker = AreaTracker(template_frame, plan, self.config.track_threshold)
+
+            schedule = None
+            if any(time_range is not None for time_range in time_ranges):
+                schedule = AreaSchedule([time_ranges[i] for i in plan.area_indices], fps)
+                logging.info(f"Time-ranged areas: {schedule.count_idle(start_frame, total_frames)} "
+                             f"of {total_frames} frames have no active area")
+            # Such frames go straight to the encoder, unless post-processing covers whole frames
+            passthrough = schedule is not None and not changes_whole_frame(self.config)
+
+            # Logos are followed and active areas looked up on the reader thread too,
+            # workers get the moved plan and the active areas' indices
+            def frame_args(index, frame):
+                offsets = tracker(frame) if tracker is not None else None
+                active = schedule.active(start_frame + index) if schedule is not None else None
+                if denoiser is not None:
+                    # Only the active areas, idle frames pass through the denoiser untouched
+                    frame_plan = plan.moved(offsets) if offsets is not None else plan
+                    frame_plans[index] = frame_plan.subset(active) if active is not None else frame_plan
+                args = scenes(index, frame) + (offsets,)
+                if schedule is None:
+                    return args
+                if not active and passthrough:
+                    return None
+                return args + (active,)
+
+            # Reader, worker pool and writer run concurrently
+            workers = self.create_workers(plan, first_frame.shape, window)
+            cache_start = self.cache.stats() if self.cache is not None else (0, 0, 0)
+            try:
+                pipeline = FramePipeline(read_frame, workers, write_frame, window,
+                                         is_cancelled=self.is_cancelled, frame_args=frame_args)
+                frame_count = pipeline.run()
+                if denoiser is not None and not self.cancelled:
+                    denoiser.flush()
+                if scenes.detector is not None:
+                    logging.info(f"Scenes: {scenes.scene_count}")
+                if tracker is not None:
+                    logging.info(f"Tracking: {tracker.full_searches} whole-frame searches")
+            finally:
+                workers.close()
+                if self.cache is not None:
+                    self.cache_stats = tuple(end - start for start, end
+                                             in zip(cache_start, self.cache.stats()))
+                    self.log_cache_stats()
+
+            # Finish
+            reader.release()
+            reader = None
+            writer.release()
+            writer = None
+
+            if not self.cancelled:
+                file_size_mb = os.path.getsize(output_path) / (1024 * 1024)
+                logging.info(f"Success: {frame_count} frames, {file_size_mb:.2f} MB")
+
+            return frame_count
+        finally:
+            if reader is not None:
+                reader.release()
+            if writer is not None:
+                try:
+                    writer.release()
+                except Exception as e:
+                    logging.error(f"Error closing output: {e}")
+
+    def log_cache_stats(self):
+        """Log inpaint cache counters of the last job"""
+        hits, misses, evictions = self.cache_stats
+        lookups = hits + misses
+        rate = 100.0 * hits / lookups if lookups else 0.0
+        logging.info(f"Inpaint cache: {hits} hits, {misses} misses ({rate:.1f}% hit rate), "
+                     f"{evictions} evictions")
+
+    def process_video_segments(self, input_path, output_path, corners):
+        """Split video at keyframes, process segments in parallel processes and join them
+
+        Every segment has its own decoder and encoder; the encoded segments
+        are concatenated without re-encoding. Needs ffmpeg.
+        """
+        if not ffmpeg_available():
+            logging.warning("ffmpeg not found on PATH, segment mode disabled")
+            return self.process_range(input_path, output_path, corners)
+
+        width, height, fps, total_frames = probe_video(input_path)
+        if total_frames <= 0 or fps <= 0:
+            raise Exception("Video contains no frames or is corrupted.")
+
+        cpu_count = os.cpu_count() or 1
+        count = self.config.segment_count or cpu_count
+        segments = plan_segments(probe_keyframes(input_path, fps), total_frames, count)
+        if len(segments) < 2:
+            logging.info("Too few keyframes to split video, processing it in one pass")
+            return self.process_range(input_path, output_path, corners)
+
+        logging.info(f"Splitting {total_frames} frames into {len(segments)} segments at "
+                     f"keyframes {[start for start, stop in segments]}")
+
+        # Detection and alpha estimation sample the whole video: run them once, every
+        # segment gets the same areas and logo models
+        first_frame = next(sample_frames(input_path, 1), None)
+        if first_frame is None:
+            raise Exception("Cannot read first frame.")
+        areas = self.resolve_areas(input_path, first_frame, corners)
+
+        # Segments already run in parallel: no nested process pools, share the cores
+        segment_config = self.config._replace(
+            segment_count=1, copy_streams=False, execution_mode="thread",
+            thread_count=max(1, cpu_count // len(segments))
+        )
+
+        ext = os.path.splitext(output_path)[1]
+        temp_dir = tempfile.mkdtemp(prefix=".segments_", dir=os.path.dirname(os.path.abspath(output_path)))
+        segment_paths = [os.path.join(temp_dir, f"segment_{i:04d}{ext}") for i in range(len(segments))]
+        try:
+            with multiprocessing.Manager() as manager:
+                progress = manager.dict()
+                cancel_event = manager.Event()
+                with ProcessPoolExecutor(max_workers=min(len(segments), cpu_count)) as executor:
+                    futures = [
+                        executor.submit(process_segment, input_path, segment_path, corners,
+                                        self.custom_areas, areas, segment_config, start, stop,
+                                        i, progress, cancel_event)
+                        for i, ((start, stop), segment_path) in enumerate(zip(segments, segment_paths))
+                    ]
+                    try:
+                        pending = futures
+                        while pending:
+                            done, pending = wait(pending, timeout=0.5, return_when=FIRST_EXCEPTION)
+                            for future in done:
+                                future.result()
+                            if self.is_cancelled():
+                                cancel_event.set()
+                            if self.progress_callback:
+                                self.progress_callback(min(sum(progress.values()), total_frames),
+                                                       total_frames)
+                    except BaseException:
+                        cancel_event.set()
+                        raise
+                    results = [future.result() for future in futures]
+
+            frame_count = sum(count for count, stats in results)
+            if self.cache is not None:
+                self.cache_stats = tuple(map(sum, zip(*(stats for count, stats in results))))
+                self.log_cache_stats()
+
+            if self.cancelled:
+                return frame_count
+
+            # Lossless join, audio, subtitles and metadata come from the input
+            source_path = input_path if self.config.copy_streams else None
+            concat_segments(segment_paths, output_path, source_path)
+
+            file_size_mb = os.path.getsize(output_path) / (1024 * 1024)
+            logging.info(f"Success: {frame_count} frames in {len(segments)} segments, "
+                         f"{file_size_mb:.2f} MB")
+            return frame_count
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def build_arg_parser():
+    """Create command line argument parser"""
+    parser = argparse.ArgumentParser(
+        description="Remove watermarks from video files without the GUI."
+    )
+    parser.add_argument("inputs", nargs="+", help="input video files")
+    parser.add_argument("--areas", help="areas JSON file saved from the GUI")
+    parser.add_argument("--area", nargs=4, type=int, action="append", default=[],
+                        metavar=("X", "Y", "W", "H"), help="manual area (can be repeated)")
+    parser.add_argument("--corner", choices=CORNER_NAMES, action="append", default=[],
+                        help="default corner area (can be repeated)")
+    parser.add_argument("--timed-area", nargs=6, action="append", default=[],
+                        metavar=("X", "Y", "W", "H", "START", "END"),
+                        help="manual area active from START to END seconds (can be repeated)")
+    parser.add_argument("--polygon", nargs="+", action="append", default=[], metavar="X,Y",
+                        help="polygon area, only its pixels are filled (can be repeated)")
+    parser.add_argument("--logo", nargs=3, action="append", default=[],
+                        metavar=("X", "Y", "IMAGE"),
+                        help="area shaped like a logo image (alpha channel or non-background "
+                             "pixels) placed at X, Y (can be repeated)")
+    parser.add_argument("--auto", dest="auto_detect", action="store_true", default=None,
+                        help="detect persistent watermarks from frames sampled across the video")
+    parser.add_argument("--detect-samples", dest="detect_samples", type=int,
+                        help="frames sampled for --auto")
+    parser.add_argument("--track", dest="track_areas", action="store_true", default=None,
+                        help="follow logos that move: areas give the logo's position in the first frame")
+    parser.add_argument("--track-threshold", dest="track_threshold", type=float,
+                        help="match score (0-1) below which the whole frame is searched for the logo")
+    parser.add_argument("--method", dest="inpaint_method", choices=INPAINT_METHODS)
+    parser.add_argument("--temporal-threshold", dest="temporal_threshold", type=float,
+                        help="margin motion (mean pixel difference) that rebuilds the "
+                             "temporal background")
+    parser.add_argument("--scene-threshold", dest="scene_threshold", type=float,
+                        help="histogram distance (0-1) that starts a new scene, "
+                             "0 = decide every frame")
+    parser.add_argument("--inpaint-scale", dest="inpaint_scale", type=int,
+                        help="inpaint at 1/N resolution and refine at full (1, 2, 4, 8, 0 = auto)")
+    parser.add_argument("--inpaint-budget", dest="inpaint_budget_ms", type=float,
+                        help="per-frame inpainting time budget in ms for --inpaint-scale 0")
+    parser.add_argument("--unblend", dest="alpha_unblend", action="store_true", default=None,
+                        help="reverse semi-transparent logos instead of inpainting them")
+    parser.add_argument("--unblend-samples", dest="alpha_samples", type=int,
+                        help="frames sampled across the video to estimate the logo")
+    parser.add_argument("--blur", dest="blur_strength", type=int)
+    parser.add_argument("--smoothing", dest="smoothing_filter", choices=SMOOTHING_FILTERS,
+                        help="edge-preserving blur: bilateral, or guided (cost independent of --blur)")
+    parser.add_argument("--margin", dest="margin_size", type=int)
+    parser.add_argument("--no-merge-areas", dest="merge_areas", action="store_false", default=None,
+                        help="process overlapping areas separately instead of as one union area")
+    parser.add_argument("--threads", dest="thread_count", type=int)
+    parser.add_argument("--in-flight", dest="max_in_flight", type=int,
+                        help="maximum frames between decoding and encoding "
+                             "(at least 2 per worker process in process mode)")
+    parser.add_argument("--execution", dest="execution_mode", choices=EXECUTION_MODES,
+                        help="run frame workers in threads or separate processes")
+    parser.add_argument("--processes", dest="process_count", type=int,
+                        help="worker processes in process mode (default: all cores)")
+    parser.add_argument("--segments", dest="segment_count", type=int,
+                        help="split video at keyframes into N segments processed in "
+                             "parallel (0 = one per core, needs ffmpeg)")
+    parser.add_argument("--cache-mb", dest="cache_size_mb", type=int,
+                        help="inpaint cache size for repeated content (0 = off)")
+    parser.add_argument("--cache-tolerance", dest="cache_tolerance", type=float,
+                        help="reuse cached areas differing by at most this mean pixel value")
+    parser.add_argument("--codec", dest="output_codec", choices=OUTPUT_CODECS)
+    parser.add_argument("--backend", dest="video_backend", choices=VIDEO_BACKENDS,
+                        help="video decode/encode backend (ffmpeg falls back to opencv if missing)")
+    parser.add_argument("--preset", dest="encoder_preset", choices=ENCODER_PRESETS,
+                        help="ffmpeg encoder preset (h264)")
+    parser.add_argument("--crf", dest="encoder_crf", type=int, help="ffmpeg encoder CRF (0-51)")
+    parser.add_argument("--encoder-threads", dest="encoder_threads", type=int,
+                        help="ffmpeg encoder threads (0 = auto)")
+    parser.add_argument("--denoise", action="store_true", default=None)
+    parser.add_argument("--denoise-scope", dest="denoise_scope", choices=DENOISE_SCOPES,
+                        help="denoise only the areas (default) or the whole frame")
+    parser.add_argument("--denoise-frames", dest="denoise_frames", type=int,
+                        help="odd number of neighbouring frames for multi-frame denoising")
+    parser.add_argument("--sharpen", action="store_true", default=None)
+    parser.add_argument("--color-correction", dest="color_correction",
+                        action="store_true", default=None)
+    parser.add_argument("--color-scope", dest="color_correction_scope",
+                        choices=COLOR_CORRECTION_SCOPES,
+                        help="apply colour correction to the whole frame or only the areas")
+    parser.add_argument("--no-copy-streams", dest="copy_streams", action="store_false",
+                        default=None, help="do not copy audio, subtitles and metadata")
+    parser.add_argument("--no-hw-accel", dest="use_hw_accel", action="store_false", default=None)
+    parser.add_argument("--no-buffering", dest="use_buffering", action="store_false", default=None)
+    parser.add_argument("-o", "--output-dir",
+                        help="output directory (default: next to each input file)")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    return parser
+
+
+def main(argv=None):
+    """Command line entry point"""
+    args = build_arg_parser().parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+    # Settings from areas file first, command line options override them
+    custom_areas = []
+    corners = []
+    settings = dict(DEFAULT_SETTINGS)
+    if args.areas:
+        custom_areas, corners, file_settings = load_areas_file(args.areas)
+        settings.update(file_settings)
+    for key in DEFAULT_SETTINGS:
+        value = getattr(args, key, None)
+        if value is not None:
+            settings[key] = value
+    custom_areas += [tuple(area) for area in args.area]
+    try:
+        shaped = [polygon_mask([point.split(",") for point in points]) for points in args.polygon]
+        shaped += [logo_mask(path, int(x), int(y)) for x, y, path in args.logo]
+        shaped += [tuple(int(value) for value in area[:4]) +
+                   (None, TimeRange(float(area[4]), float(area[5]), "s")) for area in args.timed_area]
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    custom_areas += [area for area in shaped if area is not None]
+    corners += [name for name in args.corner if name not in corners]
+
+    if not corners and not custom_areas and not settings["auto_detect"]:
+        print("error: select at least one area (--areas, --area, --timed-area, --polygon, --logo, "
+              "--corner or --auto)", file=sys.stderr)
+        return 2
+
+    try:
+        config = ProcessingConfig.from_settings(settings)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    engine = WatermarkEngine(config, custom_areas)
+    failed = 0
+    for input_path in args.inputs:
+        output_path = default_output_path(input_path, args.output_dir)
+        try:
+            frame_count = engine.process_video(input_path, output_path, corners)
+            print(f"{input_path} -> {output_path} ({frame_count} frames)")
+        except KeyboardInterrupt:
+            print("Processing cancelled", file=sys.stderr)
+            return 130
+        except Exception as e:
+            failed += 1
+            logging.error(f"Processing error: {e}")
+            print(f"{input_path}: error: {e}", file=sys.stderr)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
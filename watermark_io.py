@@ -0,0 +1,457 @@
+"""
+Video input/output backends.
+
+OpenCV (cv2.VideoCapture / cv2.VideoWriter) is always available. The FFmpeg
+backend runs ffmpeg subprocesses and pipes raw BGR frames through them: the
+decoder reads straight into preallocated NumPy buffers and the encoder gets
+every ffmpeg encoder with configurable preset, CRF and threads.
+"""
+import os
+import re
+import json
+import shutil
+import logging
+import tempfile
+import subprocess
+import cv2
+import numpy as np
+
+VIDEO_BACKENDS = ("opencv", "ffmpeg")
+ENCODER_PRESETS = ("ultrafast", "superfast", "veryfast", "faster", "fast",
+                   "medium", "slow", "slower", "veryslow")
+
+# Output codec setting -> OpenCV fourcc / ffmpeg encoder
+OPENCV_FOURCC = {"mp4v": "mp4v", "h264": "H264", "xvid": "XVID"}
+FFMPEG_ENCODERS = {"mp4v": "mpeg4", "h264": "libx264", "xvid": "libxvid"}
+
+# Subtitle codecs that MP4/MOV can store after a cheap conversion to mov_text
+TEXT_SUBTITLE_CODECS = ("subrip", "srt", "ass", "ssa", "mov_text", "webvtt", "text")
+
+
+def ffmpeg_available():
+    """Check whether ffmpeg is on PATH"""
+    return shutil.which("ffmpeg") is not None
+
+
+def probe_video(path):
+    """Return (width, height, fps, frame_count) of video file"""
+    if shutil.which("ffprobe"):
+        try:
+            return _probe_ffprobe(path)
+        except Exception as e:
+            logging.warning(f"ffprobe failed, using OpenCV: {e}")
+
+    cap = cv2.VideoCapture(path)
+    try:
+        return (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                cap.get(cv2.CAP_PROP_FPS),
+                int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+    finally:
+        cap.release()
+
+
+def _probe_ffprobe(path):
+    """Probe first video stream with ffprobe"""
+    output = subprocess.run(
+        ["ffprobe", "-v", "error", "-select_streams", "v:0",
+         "-show_entries", "stream=width,height,avg_frame_rate,r_frame_rate,nb_frames,duration"
+         ":format=duration", "-of", "json", path],
+        capture_output=True, check=True, text=True
+    ).stdout
+    data = json.loads(output)
+    stream = data["streams"][0]
+
+    def rate(value):
+        num, _, den = (value or "0/1").partition("/")
+        return float(num) / float(den or 1) if float(den or 1) else 0.0
+
+    fps = rate(stream.get("avg_frame_rate")) or rate(stream.get("r_frame_rate"))
+    frame_count = int(stream.get("nb_frames") or 0)
+    if frame_count <= 0:
+        # Containers like MKV do not store frame count
+        duration = float(stream.get("duration") or data.get("format", {}).get("duration") or 0)
+        frame_count = int(round(duration * fps))
+    return int(stream["width"]), int(stream["height"]), fps, frame_count
+
+
+# Sample spacing (frames) above which sample_frames() seeks instead of decoding through
+SAMPLE_SEEK_GAP = 120
+
+
+def sample_frames(path, count):
+    """Yield up to count frames spread evenly over the video (OpenCV)
+
+    Close samples are reached by grabbing through the frames in between,
+    seeking decodes from the previous keyframe and only pays off for
+    distant ones.
+    """
+    cap = cv2.VideoCapture(path)
+    try:
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if frame_count <= 0:
+            return
+        indices = np.unique(np.linspace(0, frame_count - 1, count).astype(int))
+        position = 0
+        for index in indices:
+            if index - position > SAMPLE_SEEK_GAP:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, int(index))
+                position = index
+            while position < index and cap.grab():
+                position += 1
+            ret, frame = cap.read()
+            if not ret:
+                return
+            position += 1
+            yield frame
+    finally:
+        cap.release()
+
+
+def probe_keyframes(path, fps):
+    """Return sorted frame numbers of keyframes in the first video stream
+
+    Only keyframes are decoded. Frame numbers are derived from timestamps,
+    so they are exact for constant frame rate video.
+    """
+    if shutil.which("ffprobe"):
+        output = subprocess.run(
+            ["ffprobe", "-v", "error", "-select_streams", "v:0", "-skip_frame", "nokey",
+             "-show_entries", "frame=pts_time", "-of", "csv=p=0", path],
+            capture_output=True, check=True, text=True
+        ).stdout
+        times = [float(value) for value in re.findall(r"^(-?[0-9.]+)", output, re.MULTILINE)]
+    else:
+        # showinfo prints the timestamp of every frame that reaches the filter
+        output = subprocess.run(
+            ["ffmpeg", "-hide_banner", "-nostats", "-skip_frame", "nokey", "-i", path,
+             "-map", "0:v:0", "-vf", "showinfo", "-f", "null", "-"],
+            capture_output=True, check=True, text=True
+        ).stderr
+        times = [float(value) for value in re.findall(r"pts_time:\s*(-?[0-9.]+)", output)]
+
+    if not times or fps <= 0:
+        return [0]
+    start = min(times)
+    return sorted({int(round((time - start) * fps)) for time in times})
+
+
+def probe_subtitle_codecs(path):
+    """Return codec names of subtitle streams, None if ffprobe is not available"""
+    if not shutil.which("ffprobe"):
+        return None
+    try:
+        output = subprocess.run(
+            ["ffprobe", "-v", "error", "-select_streams", "s",
+             "-show_entries", "stream=codec_name", "-of", "json", path],
+            capture_output=True, check=True, text=True
+        ).stdout
+    except Exception as e:
+        logging.warning(f"ffprobe failed: {e}")
+        return None
+    return [stream.get("codec_name", "") for stream in json.loads(output).get("streams", [])]
+
+
+def passthrough_args(source_path, output_path, input_index=1):
+    """ffmpeg output arguments that stream-copy audio, subtitles and metadata of an input"""
+    source = str(input_index)
+    args = ["-map", f"{source}:a?", "-c:a", "copy",
+            "-map_metadata", source, "-map_chapters", source]
+
+    # Subtitles only where the output container can hold them
+    ext = os.path.splitext(output_path)[1].lower()
+    if ext == ".mkv":
+        args += ["-map", f"{source}:s?", "-c:s", "copy"]
+    elif ext in (".mp4", ".mov", ".m4v"):
+        codecs = probe_subtitle_codecs(source_path)
+        if codecs is None:
+            logging.info("ffprobe not found, subtitles are not copied to MP4/MOV output")
+        elif codecs and all(codec in TEXT_SUBTITLE_CODECS for codec in codecs):
+            args += ["-map", f"{source}:s?", "-c:s", "mov_text"]
+        elif codecs:
+            logging.warning(f"Subtitles ({', '.join(codecs)}) cannot be stored in {ext}, skipped")
+    return args
+
+
+def mux_streams(video_path, source_path, output_path):
+    """Combine video of video_path with audio, subtitles and metadata of source_path, no re-encoding"""
+    args = ["-y", "-i", video_path, "-i", source_path, "-map", "0:v:0", "-c:v", "copy"]
+    args += passthrough_args(source_path, output_path) + [output_path]
+    _FFmpegProcess(args, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL).finish()
+
+
+def concat_segments(segment_paths, output_path, source_path=None):
+    """Join encoded segments without re-encoding (ffmpeg concat demuxer)
+
+    source_path: also stream-copy audio, subtitles and metadata of this file.
+    """
+    list_fd, list_path = tempfile.mkstemp(suffix=".txt", dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        with os.fdopen(list_fd, "w") as f:
+            for path in segment_paths:
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+
+        args = ["-y", "-f", "concat", "-safe", "0", "-i", list_path]
+        if source_path:
+            args += ["-i", source_path, "-map", "0:v:0"] + passthrough_args(source_path, output_path)
+        args += ["-c:v", "copy", output_path]
+        _FFmpegProcess(args, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL).finish()
+    finally:
+        os.remove(list_path)
+
+
+class OpenCVReader:
+    """Frame reader using cv2.VideoCapture"""
+
+    def __init__(self, path, use_hw_accel=True, start_frame=0):
+        self.cap = cv2.VideoCapture(path)
+        if use_hw_accel:
+            self.cap.set(cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY)
+        if not self.cap.isOpened():
+            raise Exception(f"Cannot open video: {path}")
+        if start_frame > 0:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    def read(self):
+        """Return next frame or None at the end"""
+        ret, frame = self.cap.read()
+        return frame if ret else None
+
+    def release(self):
+        """Close video"""
+        self.cap.release()
+
+
+class OpenCVWriter:
+    """Frame writer using cv2.VideoWriter
+
+    With source_path, video is written to a temporary file and the source's
+    audio, subtitles and metadata are stream-copied in right after encoding.
+    """
+
+    def __init__(self, path, codec, fps, size, source_path=None):
+        self.path = path
+        self.source_path = source_path
+        self.video_path = path
+        if source_path:
+            root, ext = os.path.splitext(path)
+            self.video_path = f"{root}.video_only{ext}"
+
+        fourcc = cv2.VideoWriter_fourcc(*OPENCV_FOURCC.get(codec, "mp4v"))
+        self.out = cv2.VideoWriter(self.video_path, fourcc, fps, size)
+        if not self.out.isOpened():
+            raise Exception(f"Cannot create output file: {self.video_path}")
+
+    def write(self, frame):
+        """Encode frame"""
+        self.out.write(frame)
+
+    def release(self):
+        """Finish encoding and mux passthrough streams"""
+        self.out.release()
+        if self.video_path == self.path:
+            return
+        try:
+            mux_streams(self.video_path, self.source_path, self.path)
+        except Exception as e:
+            # Keep the processed video, only the passthrough streams are lost
+            logging.warning(f"Could not copy audio/subtitles into {self.path}, "
+                            f"saving video only: {e}")
+            os.replace(self.video_path, self.path)
+        else:
+            os.remove(self.video_path)
+
+
+class _FFmpegProcess:
+    """ffmpeg subprocess with stderr kept in a temporary file for error messages"""
+
+    def __init__(self, args, **popen_kwargs):
+        self.stderr = tempfile.TemporaryFile()
+        command = ["ffmpeg", "-hide_banner", "-loglevel", "error"] + args
+        logging.info(f"Running: {' '.join(command)}")
+        self.process = subprocess.Popen(command, stderr=self.stderr, **popen_kwargs)
+
+    def error_text(self):
+        """Return last lines ffmpeg wrote to stderr"""
+        self.stderr.seek(0)
+        lines = self.stderr.read().decode(errors="replace").strip().splitlines()
+        return "\n".join(lines[-5:])
+
+    def finish(self, check=True):
+        """Wait for ffmpeg to exit, raise if it failed"""
+        returncode = self.process.wait()
+        message = self.error_text()
+        self.stderr.close()
+        if check and returncode != 0:
+            raise Exception(f"ffmpeg failed ({returncode}): {message}")
+
+    def kill(self):
+        """Stop ffmpeg immediately"""
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        self.stderr.close()
+
+
+class FFmpegReader:
+    """Frame reader decoding with ffmpeg into preallocated NumPy buffers
+
+    Buffers are reused round-robin, so a frame stays valid until `buffers`
+    more frames have been read; the caller must not hold more than that.
+    """
+
+    def __init__(self, path, use_hw_accel=True, buffers=4, start_frame=0):
+        self.width, self.height, self.fps, self.frame_count = probe_video(path)
+        if self.width <= 0 or self.height <= 0:
+            raise Exception(f"Cannot open video: {path}")
+
+        args = []
+        if use_hw_accel:
+            args += ["-hwaccel", "auto"]
+        if start_frame > 0 and self.fps > 0:
+            # Half a frame early, so timestamp rounding cannot skip the start frame
+            args += ["-ss", f"{(start_frame - 0.5) / self.fps:.6f}"]
+        # -vsync 0: pass decoded frames through, never duplicate or drop them
+        args += ["-i", path, "-map", "0:v:0", "-vsync", "0",
+                 "-f", "rawvideo", "-pix_fmt", "bgr24", "-"]
+        self.ffmpeg = _FFmpegProcess(args, stdout=subprocess.PIPE, stdin=subprocess.DEVNULL)
+
+        self.buffers = [np.empty((self.height, self.width, 3), dtype=np.uint8)
+                        for _ in range(max(1, buffers))]
+        self.index = 0
+
+    def read(self):
+        """Return next frame or None at the end"""
+        frame = self.buffers[self.index % len(self.buffers)]
+        view = memoryview(frame).cast("B")
+        filled = 0
+        while filled < len(view):
+            count = self.ffmpeg.process.stdout.readinto(view[filled:])
+            if not count:
+                if filled:
+                    logging.warning("Incomplete last frame from ffmpeg, dropped")
+                return None
+            filled += count
+        self.index += 1
+        return frame
+
+    def release(self):
+        """Stop decoder"""
+        self.ffmpeg.process.stdout.close()
+        self.ffmpeg.kill()
+
+
+def _encoder_args(path, codec, fps, size, preset, crf, threads, copy_args=()):
+    """ffmpeg arguments encoding raw BGR frames from stdin into path
+
+    copy_args: second input and its passthrough_args(), streams copied alongside.
+    """
+    width, height = size
+    encoder = FFMPEG_ENCODERS.get(codec, "mpeg4")
+    args = ["-y", "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}",
+            "-r", f"{fps}", "-i", "-"]
+    args += list(copy_args)
+    args += ["-c:v", encoder, "-threads", str(threads)]
+    if encoder == "libx264":
+        args += ["-preset", preset, "-crf", str(crf)]
+    else:
+        # MPEG-4 part 2 encoders have no CRF, map it to a quantizer (CRF 23 -> q 5)
+        args += ["-q:v", str(max(1, min(31, crf // 4)))]
+    return args + ["-pix_fmt", "yuv420p", path]
+
+
+def check_passthrough(copy_args, output_path, codec, fps):
+    """Raise if the streams of copy_args cannot be stream-copied into output_path's container
+
+    The muxer only fails once it writes the header, after the first frames
+    were already piped in, so the encoder command is first tried on one
+    small frame and a tenth of a second of the copied streams.
+    """
+    ext = os.path.splitext(output_path)[1]
+    probe_fd, probe_path = tempfile.mkstemp(suffix=ext, dir=os.path.dirname(os.path.abspath(output_path)))
+    os.close(probe_fd)
+    try:
+        args = _encoder_args(probe_path, codec, fps, (16, 16), "ultrafast", 23, 1, copy_args)
+        ffmpeg = _FFmpegProcess(args[:-1] + ["-t", "0.1", probe_path],
+                                stdin=subprocess.PIPE, stdout=subprocess.DEVNULL)
+        try:
+            ffmpeg.process.stdin.write(bytes(16 * 16 * 3))
+            ffmpeg.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        ffmpeg.finish()
+    finally:
+        os.remove(probe_path)
+
+
+class FFmpegWriter:
+    """Frame writer piping raw frames into an ffmpeg encoder
+
+    With source_path, the same ffmpeg process stream-copies the source's
+    audio, subtitles and metadata into the output while encoding. If the
+    output container cannot hold them, only the video is written.
+    """
+
+    def __init__(self, path, codec, fps, size, preset="medium", crf=23, threads=0,
+                 source_path=None):
+        copy_args = []
+        if source_path:
+            copy_args = ["-i", source_path, "-map", "0:v:0"] + passthrough_args(source_path, path)
+            try:
+                check_passthrough(copy_args, path, codec, fps)
+            except Exception as e:
+                logging.warning(f"Could not copy audio/subtitles into {path}, "
+                                f"saving video only: {e}")
+                copy_args = []
+        args = _encoder_args(path, codec, fps, size, preset, crf, threads, copy_args)
+        self.ffmpeg = _FFmpegProcess(args, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL)
+
+    def write(self, frame):
+        """Encode frame"""
+        try:
+            self.ffmpeg.process.stdin.write(memoryview(np.ascontiguousarray(frame)).cast("B"))
+        except BrokenPipeError:
+            raise Exception(f"ffmpeg encoder stopped: {self.ffmpeg.error_text()}")
+
+    def release(self):
+        """Finish encoding, raise if ffmpeg failed"""
+        try:
+            self.ffmpeg.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        self.ffmpeg.finish()
+
+
+def resolve_backend(config):
+    """Return video backend to use, falling back to OpenCV without ffmpeg"""
+    if config.video_backend == "ffmpeg" and not ffmpeg_available():
+        logging.warning("ffmpeg not found on PATH, using OpenCV backend")
+        return "opencv"
+    return config.video_backend
+
+
+def open_reader(path, config, buffers=4, start_frame=0):
+    """Open frame reader for configured backend, positioned at start_frame"""
+    if resolve_backend(config) == "ffmpeg":
+        return FFmpegReader(path, config.use_hw_accel, buffers, start_frame)
+    return OpenCVReader(path, config.use_hw_accel, start_frame)
+
+
+def open_writer(path, config, fps, size, source_path=None):
+    """Open frame writer for configured backend
+
+    source_path: copy audio, subtitles and metadata of this file (needs ffmpeg).
+    """
+    if source_path and not ffmpeg_available():
+        logging.warning("ffmpeg not found on PATH, audio and subtitles are not copied")
+        source_path = None
+    if resolve_backend(config) == "ffmpeg":
+        return FFmpegWriter(path, config.output_codec, fps, size,
+                            preset=config.encoder_preset, crf=config.encoder_crf,
+                            threads=config.encoder_threads, source_path=source_path)
+    return OpenCVWriter(path, config.output_codec, fps, size, source_path=source_path)
@@ -0,0 +1,136 @@
+"""
+Pixel masks of watermark areas.
+
+An area is normally a filled rectangle, which for thin text or an outlined
+logo inpaints many times the pixels that need it. An area can instead carry
+a uint8 mask of its rectangle's size: 255 marks pixels to fill, values in
+between blend the fill over the original (soft edges), 0 is left untouched.
+Masks are drawn as polygons or brush strokes, or derived from a logo image,
+and are trimmed to their bounding box so the area is no larger than the mask.
+
+Areas are (x, y, w, h) or (x, y, w, h, mask) tuples. In the areas JSON the
+masks are stored run-length encoded next to the rectangles.
+"""
+import cv2
+import numpy as np
+
+# Logo pixels with at least this alpha (0-255) belong to the mask
+LOGO_MIN_ALPHA = 8
+# Logo images without alpha: difference from the border colour (grey levels) that counts as logo
+LOGO_MIN_CONTRAST = 24
+# Extra border around logo masks, covers compression ringing around the strokes
+LOGO_PADDING = 2
+
+
+def rle_encode(mask):
+    """Run-length encode a uint8 mask (row-major) as "value run value run ..." string"""
+    flat = mask.ravel()
+    if flat.size == 0:
+        return ""
+    starts = np.flatnonzero(np.diff(flat)) + 1
+    starts = np.concatenate(([0], starts))
+    runs = np.diff(np.append(starts, flat.size))
+    # One string, the indented JSON would otherwise put every number on its own line
+    return " ".join(map(str, np.column_stack((flat[starts], runs)).ravel().tolist()))
+
+
+def rle_decode(rle, shape):
+    """Decode rle_encode() output to a uint8 mask of shape (h, w)"""
+    pairs = np.array(rle.split(), dtype=np.int64).reshape(-1, 2)
+    if pairs[:, 1].sum() != shape[0] * shape[1]:
+        raise ValueError(f"Mask runs do not cover a {shape[1]}x{shape[0]} area")
+    return np.repeat(pairs[:, 0].astype(np.uint8), pairs[:, 1]).reshape(shape)
+
+
+def trim_mask(x, y, mask):
+    """Crop mask placed at (x, y) to its nonzero pixels, return area tuple or None if empty"""
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    if rows.size == 0:
+        return None
+    y1, y2, x1, x2 = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+    trimmed = np.ascontiguousarray(mask[y1:y2, x1:x2])
+    return (int(x + x1), int(y + y1), int(x2 - x1), int(y2 - y1), trimmed)
+
+
+def polygon_mask(points):
+    """Masked area of a filled polygon given as [(x, y), ...] frame points"""
+    points = np.asarray(points, dtype=np.int32).reshape(-1, 2)
+    x, y = points.min(axis=0)
+    w, h = points.max(axis=0) - (x, y) + 1
+    mask = np.zeros((h, w), dtype=np.uint8)
+    cv2.fillPoly(mask, [points - (x, y)], 255)
+    return trim_mask(x, y, mask)
+
+
+def stroke_mask(points, width):
+    """Masked area of a brush stroke of the given width along [(x, y), ...] frame points"""
+    points = np.asarray(points, dtype=np.int32).reshape(-1, 2)
+    radius = max(1, width // 2)
+    x, y = points.min(axis=0) - radius
+    w, h = points.max(axis=0) - (x, y) + radius + 1
+    mask = np.zeros((h, w), dtype=np.uint8)
+    local = points - (x, y)
+    cv2.polylines(mask, [local], False, 255, thickness=2 * radius)
+    # Round ends and single clicks
+    for px, py in local:
+        cv2.circle(mask, (int(px), int(py)), radius, 255, -1)
+    return trim_mask(x, y, mask)
+
+
+def logo_mask(path, x, y):
+    """Masked area of a logo image placed with its top-left corner at (x, y)
+
+    Uses the alpha channel if the image has one, otherwise pixels that
+    differ from the image's border colour.
+    """
+    image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if image is None:
+        raise ValueError(f"Cannot read logo image: {path}")
+    if image.ndim == 3 and image.shape[2] == 4:
+        if image.dtype != np.uint8:
+            image = (image // 257).astype(np.uint8)
+        mask = image[:, :, 3] >= LOGO_MIN_ALPHA
+    else:
+        gray = image if image.ndim == 2 else cv2.cvtColor(image[:, :, :3], cv2.COLOR_BGR2GRAY)
+        gray = gray.astype(np.float32)
+        border = np.concatenate((gray[0], gray[-1], gray[:, 0], gray[:, -1]))
+        mask = np.abs(gray - np.median(border)) > LOGO_MIN_CONTRAST
+    mask = mask.astype(np.uint8) * 255
+
+    # Pad outwards, the mask may then start left of or above (x, y)
+    mask = cv2.copyMakeBorder(mask, LOGO_PADDING, LOGO_PADDING, LOGO_PADDING, LOGO_PADDING,
+                              cv2.BORDER_CONSTANT, value=0)
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * LOGO_PADDING + 1, 2 * LOGO_PADDING + 1))
+    return trim_mask(x - LOGO_PADDING, y - LOGO_PADDING, cv2.dilate(mask, kernel))
+
+
+def split_area_masks(areas):
+    """Split (x, y, w, h[, mask]) areas into rectangles and masks (None: whole rectangle)"""
+    rects = [tuple(int(value) for value in area[:4]) for area in areas]
+    masks = [area[4] if len(area) > 4 else None for area in areas]
+    return rects, masks
+
+
+def masks_to_json(areas):
+    """RLE masks of areas for the areas JSON, None if no area has a mask"""
+    _, masks = split_area_masks(areas)
+    if all(mask is None for mask in masks):
+        return None
+    return [None if mask is None else {"rle": rle_encode(mask)} for mask in masks]
+
+
+def areas_from_json(areas_data, masks_data=None):
+    """Rebuild area tuples from the areas JSON's "areas" and "masks" lists"""
+    areas = [tuple(area) for area in areas_data]
+    if not masks_data:
+        return areas
+    if len(masks_data) != len(areas):
+        raise ValueError(f"{len(masks_data)} masks for {len(areas)} areas")
+    result = []
+    for (x, y, w, h), mask_data in zip(areas, masks_data):
+        if mask_data is None:
+            result.append((x, y, w, h))
+        else:
+            result.append((x, y, w, h, rle_decode(mask_data["rle"], (h, w))))
+    return result
@@ -0,0 +1,291 @@
+"""
+PatchMatch exemplar inpainting.
+
+Masked pixels are rebuilt from patches copied from the unmasked part of the
+area, so texture (grass, fabric, film grain) survives where Telea and NS
+smear it. The nearest-neighbour field (NNF) stores, for every patch that
+touches the mask, the position of the most similar fully known patch. It is
+found with PatchMatch (Barnes et al. 2009): guesses improved by taking over
+the matches of neighbours and by random search around the current match.
+All patches are updated at once with NumPy instead of the sequential scan of
+the paper.
+
+A cold solve runs coarse to fine with several match + vote (EM) steps per
+level (Wexler et al. 2007). Consecutive video frames barely differ, so the
+field of the previous frame is already a close guess: PatchFields keeps it
+per area and later frames only run WARM_STEPS short refinement steps at full
+resolution.
+"""
+import threading
+import cv2
+import numpy as np
+
+# Patch side in pixels (odd)
+PATCH_SIZE = 7
+# Match + vote steps per pyramid level of a cold solve, and per warm-started frame
+COLD_STEPS = 2
+WARM_STEPS = 1
+# Pixel step of the patch samples compared by the distance
+DISTANCE_STEP = 2
+# Random search radius of warm-started frames (matches move little between frames)
+WARM_RADIUS = 8
+# Pyramid stops when the hole is at most this many pixels thick
+COARSEST_HOLE = 2 * PATCH_SIZE
+
+
+class PatchLevel:
+    """Patch positions of one pyramid level, fixed while the mask stays the same"""
+
+    def __init__(self, image, hole):
+        radius = PATCH_SIZE // 2
+        kernel = np.ones((PATCH_SIZE, PATCH_SIZE), dtype=np.uint8)
+        self.image = image.astype(np.float32)
+        self.hole = hole
+        self.shape = hole.shape
+        height, width = hole.shape
+
+        # Patches overlapping the hole are matched, fully known ones inside the area are sources
+        target = cv2.dilate(hole.astype(np.uint8), kernel) > 0
+        self.valid = cv2.erode((~hole).astype(np.uint8), kernel,
+                               borderType=cv2.BORDER_CONSTANT, borderValue=0) > 0
+        self.target_y, self.target_x = np.nonzero(target)
+        self.source_y, self.source_x = np.nonzero(self.valid)
+        self.hole_y, self.hole_x = np.nonzero(hole)
+
+        # Distances compare every DISTANCE_STEP-th pixel of the patches; each pixel's
+        # samples form one row, so a candidate costs a single contiguous gather
+        padded_width = width + 2 * radius
+        dy, dx = np.mgrid[-radius:radius + 1:DISTANCE_STEP, -radius:radius + 1:DISTANCE_STEP]
+        self.sample_offsets = (dy * padded_width + dx).ravel()
+        grid_y, grid_x = np.indices(self.shape)
+        self.centres = ((grid_y + radius) * padded_width + grid_x + radius).ravel()
+        self.features = self.patch_features(self.image)
+        self.flat_image = self.image.reshape(-1, self.image.shape[2])
+
+    def patch_features(self, image, where=None):
+        """Patch samples of every pixel (or of the flat indices in where) as rows"""
+        radius = PATCH_SIZE // 2
+        padded = cv2.copyMakeBorder(image, radius, radius, radius, radius, cv2.BORDER_REFLECT)
+        padded = padded.reshape(-1, image.shape[2])
+        centres = self.centres if where is None else self.centres[where]
+        return padded[centres[:, None] + self.sample_offsets].reshape(centres.size, -1)
+
+    def random_field(self, rng):
+        """Field matching every patch with a random source patch"""
+        field = np.indices(self.shape, dtype=np.int32).transpose(1, 2, 0).copy()
+        pick = rng.integers(0, self.source_y.size, self.target_y.size)
+        field[self.target_y, self.target_x, 0] = self.source_y[pick]
+        field[self.target_y, self.target_x, 1] = self.source_x[pick]
+        return field
+
+    def upsample_field(self, coarse_field, rng):
+        """Field of this level from the field of the half-resolution level"""
+        height, width = self.shape
+        ys = np.minimum(np.arange(height) // 2, coarse_field.shape[0] - 1)
+        xs = np.minimum(np.arange(width) // 2, coarse_field.shape[1] - 1)
+        field = coarse_field[ys[:, None], xs[None, :]] * 2
+        field[..., 0] += (np.arange(height) % 2)[:, None]
+        field[..., 1] += (np.arange(width) % 2)[None, :]
+        field[..., 0].clip(0, height - 1, out=field[..., 0])
+        field[..., 1].clip(0, width - 1, out=field[..., 1])
+
+        # Sources that became partly masked at this resolution start over
+        sources = field[self.target_y, self.target_x]
+        invalid = ~self.valid[sources[:, 0], sources[:, 1]]
+        pick = rng.integers(0, self.source_y.size, np.count_nonzero(invalid))
+        field[self.target_y[invalid], self.target_x[invalid], 0] = self.source_y[pick]
+        field[self.target_y[invalid], self.target_x[invalid], 1] = self.source_x[pick]
+        return field
+
+    def match(self, field, estimate, rng, max_radius=None):
+        """One PatchMatch pass over all patches against the current estimate, updates field
+
+        Returns the squared patch distance of every matched patch.
+        """
+        height, width = self.shape
+        target_patches = self.patch_features(estimate, self.target_y * width + self.target_x)
+        source_y = field[self.target_y, self.target_x, 0].copy()
+        source_x = field[self.target_y, self.target_x, 1].copy()
+        distance = self.distance(target_patches, source_y, source_x)
+
+        def try_candidates(candidate_y, candidate_x):
+            inside = (candidate_y >= 0) & (candidate_y < height) & (candidate_x >= 0) & (candidate_x < width)
+            inside[inside] = self.valid[candidate_y[inside], candidate_x[inside]]
+            chosen = np.flatnonzero(inside)
+            candidate_distance = self.distance(target_patches[chosen], candidate_y[chosen],
+                                               candidate_x[chosen])
+            better = candidate_distance < distance[chosen]
+            chosen = chosen[better]
+            source_y[chosen] = candidate_y[chosen]
+            source_x[chosen] = candidate_x[chosen]
+            distance[chosen] = candidate_distance[better]
+
+        # Propagation: the neighbour's match, shifted back by the same step
+        for dy, dx in ((0, 1), (1, 0), (0, -1), (-1, 0)):
+            neighbour_y = np.clip(self.target_y + dy, 0, height - 1)
+            neighbour_x = np.clip(self.target_x + dx, 0, width - 1)
+            try_candidates(field[neighbour_y, neighbour_x, 0] - dy,
+                           field[neighbour_y, neighbour_x, 1] - dx)
+            field[self.target_y, self.target_x, 0] = source_y
+            field[self.target_y, self.target_x, 1] = source_x
+
+        # Random search in windows of halving size around the current match
+        radius = max(height, width) if max_radius is None else max_radius
+        while radius >= 1:
+            size = source_y.size
+            try_candidates(source_y + rng.integers(-radius, radius + 1, size),
+                           source_x + rng.integers(-radius, radius + 1, size))
+            radius //= 2
+        field[self.target_y, self.target_x, 0] = source_y
+        field[self.target_y, self.target_x, 1] = source_x
+        return distance
+
+    def distance(self, target_patches, source_y, source_x):
+        """Sum of squared differences between target patches and source patches"""
+        difference = self.features[source_y * self.shape[1] + source_x] - target_patches
+        return np.einsum("ij,ij->i", difference, difference)
+
+    def copy_centres(self, field):
+        """Return estimate with every hole pixel the centre of its own patch's match"""
+        estimate = self.image.copy()
+        sources = field[self.hole_y, self.hole_x]
+        estimate[self.hole_y, self.hole_x] = self.image[sources[:, 0], sources[:, 1]]
+        return estimate
+
+    def vote(self, field, distance=None):
+        """Return estimate with every hole pixel the weighted mean of the patches covering it"""
+        height, width = self.shape
+        radius = PATCH_SIZE // 2
+        weight_map = np.ones(self.shape, dtype=np.float32)
+        if distance is not None and distance.size:
+            # Poor matches count less (Wexler et al.), scaled to the typical match
+            scale = 2 * max(float(np.percentile(distance, 75)), 1.0)
+            weight_map[self.target_y, self.target_x] = np.exp(-distance / scale)
+
+        # Accumulate over the hole's bounding box with whole-array slices
+        source = field[..., 0] * width + field[..., 1]
+        top, bottom = self.hole_y.min(), self.hole_y.max() + 1
+        left, right = self.hole_x.min(), self.hole_x.max() + 1
+        total = np.zeros((bottom - top, right - left, self.image.shape[2]), dtype=np.float32)
+        weights = np.full((bottom - top, right - left), 1e-6, dtype=np.float32)
+        for dy in range(-radius, radius + 1):
+            # Patch centred at (y - dy, x - dx) covers pixel (y, x) with its (dy, dx) pixel
+            y1, y2 = max(top, dy), min(bottom, height + dy)
+            for dx in range(-radius, radius + 1):
+                x1, x2 = max(left, dx), min(right, width + dx)
+                centres = (slice(y1 - dy, y2 - dy), slice(x1 - dx, x2 - dx))
+                covered = (slice(y1 - top, y2 - top), slice(x1 - left, x2 - left))
+                weight = weight_map[centres]
+                pixels = self.flat_image[source[centres] + dy * width + dx]
+                total[covered] += pixels * weight[..., np.newaxis]
+                weights[covered] += weight
+
+        estimate = self.image.copy()
+        estimate[self.hole_y, self.hole_x] = (total / weights[..., np.newaxis])[self.hole_y - top,
+                                                                               self.hole_x - left]
+        return estimate
+
+
+def build_levels(image, hole):
+    """Pyramid of PatchLevels, finest first"""
+    levels = [PatchLevel(image, hole)]
+    while True:
+        rows = np.flatnonzero(hole.any(axis=1))
+        cols = np.flatnonzero(hole.any(axis=0))
+        height, width = hole.shape
+        if min(rows[-1] - rows[0], cols[-1] - cols[0]) < COARSEST_HOLE or \
+                min(height, width) // 2 < 3 * PATCH_SIZE:
+            return levels
+        small_size = (width // 2, height // 2)
+        image = cv2.resize(image, small_size, interpolation=cv2.INTER_AREA)
+        # Small pixel is masked if any of its source pixels is
+        hole = cv2.resize(hole.astype(np.uint8), small_size, interpolation=cv2.INTER_AREA) > 0
+        level = PatchLevel(image, hole)
+        if level.source_y.size == 0:
+            return levels
+        levels.append(level)
+
+
+def patchmatch_fill(image, mask, field=None, steps=WARM_STEPS, seed=0):
+    """Inpaint masked pixels of image from its unmasked patches
+
+    field is the nearest-neighbour field of an earlier call with the same
+    mask; when given, only `steps` refinement steps run at full resolution
+    instead of a coarse-to-fine solve. Returns (result, field), field is None
+    if the area has no complete patch to copy from (Telea fill instead).
+    """
+    hole = mask > 0
+    if not hole.any():
+        return image.copy(), None
+    rng = np.random.default_rng(seed)
+
+    if field is not None and field.shape[:2] == hole.shape:
+        # Other frames may start from the same field
+        field = field.copy()
+        level = PatchLevel(image, hole)
+        # Rough starting point, the refinement steps vote properly
+        estimate = level.copy_centres(field)
+        for _ in range(steps):
+            distance = level.match(field, estimate, rng, WARM_RADIUS)
+            estimate = level.vote(field, distance)
+    else:
+        levels = build_levels(image, hole) if min(hole.shape) >= PATCH_SIZE else []
+        if not levels or levels[0].source_y.size == 0:
+            return cv2.inpaint(image, mask, 3, cv2.INPAINT_TELEA), None
+
+        # Coarsest level starts from a quick diffusion fill and random matches
+        coarsest = levels[-1]
+        estimate = cv2.inpaint(coarsest.image.astype(np.uint8),
+                               coarsest.hole.astype(np.uint8), 3, cv2.INPAINT_TELEA).astype(np.float32)
+        field = coarsest.random_field(rng)
+        for index in range(len(levels) - 1, -1, -1):
+            level = levels[index]
+            if level is not coarsest:
+                field = level.upsample_field(field, rng)
+                estimate = level.vote(field)
+            for _ in range(COLD_STEPS):
+                distance = level.match(field, estimate, rng)
+                estimate = level.vote(field, distance)
+
+    result = image.copy()
+    result[hole] = np.clip(estimate[hole] + 0.5, 0, 255).astype(np.uint8)
+    return result, field
+
+
+class PatchFields:
+    """Nearest-neighbour fields of all areas from the latest frame, shared by the frame workers
+
+    steps is the number of refinement steps of a warm-started frame. A new
+    scene starts cold. Worker processes that receive a copy start without
+    fields of their own.
+    """
+
+    def __init__(self, steps=WARM_STEPS):
+        self.steps = int(steps)
+        self._reset_fields()
+
+    def _reset_fields(self):
+        """Start without any field"""
+        self._fields = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return self.steps
+
+    def __setstate__(self, state):
+        self.steps = state
+        self._reset_fields()
+
+    def area_fill(self, area, scene=None):
+        """Return fill(image, mask) that starts from the area's latest field of the same scene"""
+        def fill(image, mask):
+            with self._lock:
+                latest = self._fields.get(area)
+            # Frames run in parallel: the latest field may be from any nearby frame
+            field = latest[1] if latest is not None and latest[0] == scene else None
+            result, field = patchmatch_fill(image, mask, field, self.steps)
+            if field is not None:
+                with self._lock:
+                    self._fields[area] = (scene, field)
+            return result
+        return fill
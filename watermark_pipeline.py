@@ -0,0 +1,219 @@
+"""
+Streaming frame pipeline: decode -> process -> encode.
+
+A reader thread decodes frames and hands them to a worker pool, a writer
+thread collects the results in frame order and encodes them. The stages
+overlap, so throughput is limited by the slowest stage, and a bounded
+in-flight window caps how many decoded frames are held in memory.
+"""
+import time
+import queue
+import logging
+import threading
+import numpy as np
+from multiprocessing import shared_memory
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+
+class ThreadWorkers:
+    """Frame worker pool running func(frame, *args, *frame_args) in threads"""
+
+    def __init__(self, func, args=(), max_workers=4):
+        self.func = func
+        self.args = tuple(args)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def submit(self, index, frame, *frame_args):
+        """Start processing frame, return future"""
+        return self.executor.submit(self.func, frame, *self.args, *frame_args)
+
+    def result(self, index, future):
+        """Wait for processed frame"""
+        return future.result()
+
+    def close(self):
+        """Shut down worker pool"""
+        self.executor.shutdown(wait=True)
+
+
+# Per-process state of ProcessWorkers, set by _init_process_worker
+_worker_state = {}
+
+
+def _init_process_worker(shm_name, ring_shape, func, args, initializer):
+    """Attach worker process to the shared frame ring"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _worker_state["shm"] = shm
+    _worker_state["ring"] = np.ndarray(ring_shape, dtype=np.uint8, buffer=shm.buf)
+    _worker_state["func"] = func
+    _worker_state["args"] = args
+    if initializer is not None:
+        initializer()
+
+
+def _process_slot(slot, *frame_args):
+    """Process frame stored in ring slot, write result back into the slot"""
+    frame = _worker_state["ring"][slot]
+    result = _worker_state["func"](frame, *_worker_state["args"], *frame_args)
+    if result is not frame:
+        frame[...] = result
+
+
+class ProcessWorkers:
+    """Frame worker pool running func(frame, *args, *frame_args) in separate processes
+
+    Frames travel through a ring of shared-memory slots instead of being
+    pickled; only slot numbers and the small per-frame args are sent to the
+    workers. func and args are
+    pickled once per worker process. The pipeline window must not exceed
+    the number of slots.
+    """
+
+    def __init__(self, func, args, frame_shape, slots, max_workers=None, initializer=None):
+        self.frame_shape = tuple(frame_shape)
+        self.slots = int(slots)
+        ring_shape = (self.slots,) + self.frame_shape
+        self.shm = shared_memory.SharedMemory(create=True, size=int(np.prod(ring_shape)))
+        self.ring = np.ndarray(ring_shape, dtype=np.uint8, buffer=self.shm.buf)
+        try:
+            self.executor = ProcessPoolExecutor(
+                max_workers=max_workers,
+                initializer=_init_process_worker,
+                initargs=(self.shm.name, ring_shape, func, tuple(args), initializer)
+            )
+        except Exception:
+            self._release_ring()
+            raise
+
+    def submit(self, index, frame, *frame_args):
+        """Copy frame into its ring slot and start processing it"""
+        if frame.shape != self.frame_shape:
+            raise ValueError(f"Frame shape {frame.shape} does not match {self.frame_shape}")
+        slot = index % self.slots
+        self.ring[slot] = frame
+        return self.executor.submit(_process_slot, slot, *frame_args)
+
+    def result(self, index, future):
+        """Wait for processed frame, returns view of its slot (valid until the slot is reused)"""
+        future.result()
+        return self.ring[index % self.slots]
+
+    def close(self):
+        """Shut down worker processes and free shared memory"""
+        self.executor.shutdown(wait=True)
+        self._release_ring()
+
+    def _release_ring(self):
+        """Free shared memory ring"""
+        self.ring = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+class FramePipeline:
+    """Ordered three-stage pipeline with backpressure
+
+    read_frame() returns the next frame or None at the end, workers is a
+    ThreadWorkers-like pool and write_frame(index, frame) is called in frame
+    order. At most `window` frames are between decoding and encoding.
+    frame_args(index, frame), if given, runs on the reader thread in frame
+    order and returns a tuple of extra worker arguments for that frame, or
+    None to pass the frame to write_frame unprocessed (it skips the workers).
+    """
+
+    def __init__(self, read_frame, workers, write_frame, window=16, is_cancelled=None,
+                 frame_args=None):
+        self.read_frame = read_frame
+        self.workers = workers
+        self.write_frame = write_frame
+        self.frame_args = frame_args
+        self.window = max(1, int(window))
+        self.is_cancelled = is_cancelled
+        self.frames_written = 0
+        # Time each stage spent on its own work (not waiting)
+        self.read_seconds = 0.0
+        self.write_seconds = 0.0
+
+    def run(self):
+        """Run pipeline until input ends, return number of written frames"""
+        self._slots = threading.Semaphore(self.window)
+        # Room for every in-flight frame plus the end marker
+        self._pending = queue.Queue(maxsize=self.window + 1)
+        self._stop = threading.Event()
+        self._errors = []
+
+        start = time.perf_counter()
+        reader = threading.Thread(target=self._guard, args=(self._read_loop,),
+                                  name="frame-reader", daemon=True)
+        writer = threading.Thread(target=self._guard, args=(self._write_loop,),
+                                  name="frame-writer", daemon=True)
+        reader.start()
+        writer.start()
+        reader.join()
+        writer.join()
+
+        if self._errors:
+            raise self._errors[0]
+
+        elapsed = time.perf_counter() - start
+        logging.info(f"Pipeline: {self.frames_written} frames in {elapsed:.2f} s "
+                     f"(read {self.read_seconds:.2f} s, write {self.write_seconds:.2f} s, "
+                     f"window {self.window})")
+        return self.frames_written
+
+    def _guard(self, loop):
+        """Run stage loop, record first error and stop the other stage"""
+        try:
+            loop()
+        except BaseException as e:
+            self._errors.append(e)
+            self._stop.set()
+
+    def _read_loop(self):
+        """Decode frames and submit them to the workers"""
+        index = 0
+        try:
+            while not self._stop.is_set():
+                if self.is_cancelled is not None and self.is_cancelled():
+                    break
+
+                start = time.perf_counter()
+                frame = self.read_frame()
+                if frame is None:
+                    break
+                extra = self.frame_args(index, frame) if self.frame_args is not None else ()
+                self.read_seconds += time.perf_counter() - start
+
+                # Backpressure: wait for a free slot in the in-flight window
+                while not self._slots.acquire(timeout=0.1):
+                    if self._stop.is_set():
+                        return
+
+                if extra is None:
+                    self._pending.put((index, None, frame))
+                else:
+                    self._pending.put((index, self.workers.submit(index, frame, *extra), None))
+                index += 1
+        finally:
+            self._pending.put(None)
+
+    def _write_loop(self):
+        """Collect processed frames in order and encode them"""
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+            if self._stop.is_set():
+                # Drain after an error in the other stage
+                continue
+
+            index, future, frame = item
+            if future is not None:
+                frame = self.workers.result(index, future)
+
+            start = time.perf_counter()
+            self.write_frame(index, frame)
+            self.write_seconds += time.perf_counter() - start
+
+            self.frames_written += 1
+            self._slots.release()
@@ -0,0 +1,45 @@
+"""
+Scene-cut detection.
+
+Runs on the decode thread: every frame is shrunk to a thumbnail and its
+hue/saturation histogram is compared with the previous frame's. Decisions
+that only depend on the shot (inpainting method, colour-correction LUT,
+temporal background models) are then made once per scene instead of once
+per frame.
+"""
+from collections import namedtuple
+import cv2
+
+# Per-scene decisions handed to the frame workers
+# textured: per area, whether "mixed" uses Telea alone; lut: L channel LUT or None
+SceneContext = namedtuple("SceneContext", ["index", "textured", "lut"])
+
+
+class SceneDetector:
+    """Detect cuts by Bhattacharyya distance of thumbnail histograms
+
+    threshold is the distance (0..1) between consecutive frames that starts
+    a new scene.
+    """
+
+    def __init__(self, threshold=0.3, size=(64, 36), bins=(16, 16)):
+        self.threshold = threshold
+        self.size = size
+        self.bins = bins
+        self.previous = None
+
+    def histogram(self, frame):
+        """Normalized hue/saturation histogram of downscaled frame"""
+        # Nearest neighbour only touches the sampled pixels, not the whole frame
+        thumbnail = cv2.resize(frame, self.size, interpolation=cv2.INTER_NEAREST)
+        hsv = cv2.cvtColor(thumbnail, cv2.COLOR_BGR2HSV)
+        hist = cv2.calcHist([hsv], [0, 1], None, list(self.bins), [0, 180, 0, 256])
+        return cv2.normalize(hist, hist, 1.0, 0.0, cv2.NORM_L1)
+
+    def is_cut(self, frame):
+        """Check whether frame starts a new scene (always true for the first frame)"""
+        hist = self.histogram(frame)
+        previous, self.previous = self.previous, hist
+        if previous is None:
+            return True
+        return cv2.compareHist(previous, hist, cv2.HISTCMP_BHATTACHARYYA) > self.threshold
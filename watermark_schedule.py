@@ -0,0 +1,107 @@
+"""
+Time ranges of watermark areas.
+
+Many clips carry a watermark only during an intro or an outro. An area can be
+limited to a time range, (x, y, w, h, mask, time_range) with mask None for a
+plain rectangle, in seconds or in frames. The ranges are turned into an
+interval index once per video: the sorted frame numbers where the set of
+active areas changes, with that set stored per interval. Each frame then
+finds its active areas with one binary search, however many areas there are.
+"""
+from bisect import bisect_right
+from collections import namedtuple
+import math
+
+# start/end: seconds (unit "s") or frame numbers (unit "frame"), end not included,
+# None: from the start / to the end of the video
+TimeRange = namedtuple("TimeRange", ["start", "end", "unit"])
+
+
+def time_range_frames(time_range, fps):
+    """(first frame, frame after the last or None) of a TimeRange"""
+    start, end, unit = time_range
+    if unit == "s":
+        # Frame i is shown at i / fps, rounded so 2.0 s at 25 fps is frame 50
+        start = None if start is None else math.ceil(round(start * fps, 6))
+        end = None if end is None else math.ceil(round(end * fps, 6))
+    return max(0, int(start or 0)), None if end is None else int(end)
+
+
+def area_time_ranges(areas):
+    """TimeRange of each (x, y, w, h[, mask[, time_range]]) area, None: whole video"""
+    return [area[5] if len(area) > 5 else None for area in areas]
+
+
+class AreaSchedule:
+    """Interval index of the active areas per frame
+
+    time_ranges: TimeRange or None per area, fps converts ranges in seconds.
+    """
+
+    def __init__(self, time_ranges, fps):
+        spans = [(0, None) if time_range is None else time_range_frames(time_range, fps)
+                 for time_range in time_ranges]
+        # Active set only changes where a range starts or ends
+        bounds = sorted({0} | {start for start, _ in spans} |
+                        {end for _, end in spans if end is not None})
+        self.bounds = bounds
+        self.active_areas = [tuple(i for i, (start, end) in enumerate(spans)
+                                   if start <= bound and (end is None or bound < end))
+                             for bound in bounds]
+
+    def active(self, frame_index):
+        """Indices of the areas active in frame frame_index"""
+        return self.active_areas[bisect_right(self.bounds, frame_index) - 1]
+
+    def count_idle(self, start_frame, frame_count):
+        """Frames without any active area among frame_count frames from start_frame"""
+        stop = start_frame + frame_count
+        idle = 0
+        for i, bound in enumerate(self.bounds):
+            if self.active_areas[i]:
+                continue
+            next_bound = self.bounds[i + 1] if i + 1 < len(self.bounds) else stop
+            idle += max(0, min(next_bound, stop) - max(bound, start_frame))
+        return idle
+
+
+def ranges_to_json(areas):
+    """Time ranges of areas for the areas JSON, None if no area has one"""
+    time_ranges = area_time_ranges(areas)
+    if all(time_range is None for time_range in time_ranges):
+        return None
+    result = []
+    for time_range in time_ranges:
+        if time_range is None:
+            result.append(None)
+        elif time_range.unit == "frame":
+            result.append({"start_frame": time_range.start, "end_frame": time_range.end})
+        else:
+            result.append({"start": time_range.start, "end": time_range.end})
+    return result
+
+
+def time_range_from_json(data):
+    """TimeRange of a "ranges" entry, frames if it has start_frame / end_frame"""
+    if data is None:
+        return None
+    if "start_frame" in data or "end_frame" in data:
+        return TimeRange(data.get("start_frame"), data.get("end_frame"), "frame")
+    return TimeRange(data.get("start"), data.get("end"), "s")
+
+
+def add_time_ranges(areas, ranges_data=None):
+    """Attach the areas JSON's "ranges" list to area tuples"""
+    if not ranges_data:
+        return areas
+    if len(ranges_data) != len(areas):
+        raise ValueError(f"{len(ranges_data)} time ranges for {len(areas)} areas")
+    result = []
+    for area, data in zip(areas, ranges_data):
+        time_range = time_range_from_json(data)
+        if time_range is None:
+            result.append(area)
+        else:
+            mask = area[4] if len(area) > 4 else None
+            result.append(tuple(area[:4]) + (mask, time_range))
+    return result
@@ -0,0 +1,141 @@
+"""
+Temporal background fill for static camera shots.
+
+Instead of inpainting every frame from scratch, each area keeps a background
+model: the fill computed from the median of its first few frames after the
+last change. While the pixels around the watermark (the margin ring) stay
+close to the reference frame, the stored fill is blended in as is, so static
+shots cost about a copy per frame and do not shimmer. When the ring moves
+past the threshold the model is rebuilt from the current frame.
+"""
+import threading
+import cv2
+import numpy as np
+
+# Frames combined by the rolling median after each reset
+TEMPORAL_HISTORY = 5
+
+
+class AreaBackground:
+    """Background model of one area"""
+
+    def __init__(self, ring_mask):
+        # Pixels outside the watermark rectangle, used to detect motion
+        # (whole area when there is no margin)
+        self.ring_mask = ring_mask if ring_mask.any() else None
+        self.reference = None
+        self.history = []
+        self.fill = None
+        self.scene = None
+        # Guards this model only, fills are computed outside of it; notified
+        # when a fill is stored
+        self.changed = threading.Condition()
+        # A worker is computing the fill, and the model version it is for
+        self.refreshing = False
+        self.generation = 0
+
+    def motion(self, region):
+        """Mean absolute difference of the margin ring against the reference"""
+        diff = cv2.absdiff(region, self.reference)
+        return max(cv2.mean(diff, mask=self.ring_mask)[:3])
+
+
+class TemporalFill:
+    """Background models of all areas, shared by the frame workers
+
+    threshold is the mean absolute ring difference (0-255) above which an
+    area is refilled. Worker processes that receive a copy start with empty
+    models of their own.
+    """
+
+    def __init__(self, threshold=4.0, history=TEMPORAL_HISTORY):
+        self.threshold = float(threshold)
+        self.history = int(history)
+        self._reset_models()
+
+    def _reset_models(self):
+        """Start without any background"""
+        self._models = {}
+        # Guards the model dict, each model has a lock of its own
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return self.threshold, self.history
+
+    def __setstate__(self, state):
+        self.threshold, self.history = state
+        self._reset_models()
+
+    def _model(self, area_plan):
+        """Return model of area, create it on first use"""
+        key = (area_plan.area, area_plan.mask.shape)
+        model = self._models.get(key)
+        if model is None:
+            model = AreaBackground(cv2.bitwise_not(area_plan.mask))
+            self._models[key] = model
+        return model
+
+    def fill(self, area_plan, region, compute_fill, scene=None):
+        """Return fill of the area for this frame
+
+        compute_fill(region) inpaints an area from scratch; it only runs while
+        a model is (re)built, static frames reuse the stored fill. scene is
+        the frame's scene number: a new scene always rebuilds the model.
+        Locks are held only for the bookkeeping, so workers inpaint other
+        areas, or other shots of the same area, at the same time.
+        """
+        with self._lock:
+            model = self._model(area_plan)
+
+        history = None
+        generation = None
+        with model.changed:
+            if scene is not None and model.scene is not None and scene < model.scene:
+                # Late frame of the previous scene, keep the current model
+                background = region
+            else:
+                new_scene = scene is not None and scene != model.scene
+                model.scene = scene
+                # Another worker is building the fill for this shot: wait for it
+                while (model.fill is None and model.refreshing and not new_scene and
+                       model.motion(region) <= self.threshold):
+                    model.changed.wait()
+
+                if model.fill is not None and not new_scene and model.motion(region) <= self.threshold:
+                    if len(model.history) >= self.history:
+                        return model.fill
+                    # Still collecting frames for the median
+                    model.history.append(region.copy())
+                    if model.refreshing:
+                        # Another worker is updating the fill, the stored one is close enough
+                        return model.fill
+                    history = list(model.history)
+                else:
+                    # First frame, new scene or the shot changed: drop the old model
+                    model.reference = region.copy()
+                    model.history = [model.reference]
+                    model.fill = None
+                    model.generation += 1
+                background = model.reference
+                model.refreshing = True
+                generation = model.generation
+
+        if history is not None:
+            background = np.median(np.stack(history), axis=0).astype(np.uint8)
+        try:
+            fill = compute_fill(background)
+        except BaseException:
+            if generation is not None:
+                with model.changed:
+                    if model.generation == generation:
+                        model.refreshing = False
+                    model.changed.notify_all()
+            raise
+        if generation is not None:
+            with model.changed:
+                # A newer reset may have started meanwhile, its fill wins
+                if model.generation == generation:
+                    model.fill = fill
+                    model.refreshing = False
+                model.changed.notify_all()
+        return fill
@@ -0,0 +1,138 @@
+"""
+Tracking of watermarks that move around the frame.
+
+Some platforms move their logo every few seconds. Each area's pixels in the
+video's first frame become the logo template, and every frame the template
+is searched for in a small window around its previous position: first on
+frames shrunk TRACK_SCALE times, then at full resolution around the coarse
+match. Only when the best match is weak (the logo jumped) is the whole
+frame searched, coarse-to-fine as well. The template is refined with every
+confident match, the background it was cut from averages out and the logo
+remains.
+"""
+import cv2
+import numpy as np
+
+# Downscale factor of the coarse search
+TRACK_SCALE = 4
+# Movement (full-resolution pixels) searched around the previous position every frame
+TRACK_RADIUS = 16
+# Share of each confident match blended into the template
+TRACK_LEARN_RATE = 0.05
+# Score advantage a new position needs over the previous one (no 1-pixel jitter)
+TRACK_HYSTERESIS = 0.02
+# Frames without a whole-frame search after one failed (logo hidden or faded out)
+TRACK_RETRY = 10
+
+
+class LogoTracker:
+    """Follow one area's logo from frame to frame
+
+    Not thread-safe: update() must see the frames in order (reader thread).
+    """
+
+    def __init__(self, template_frame, area, threshold):
+        x, y, w, h = area
+        self.template = gray_region(template_frame, (slice(y, y + h), slice(x, x + w)))
+        self.template = self.template.astype(np.float32)
+        self.position = (x, y)
+        self.threshold = threshold
+        # Coarse search only pays off when the shrunk template keeps some detail
+        self.scale = TRACK_SCALE if min(self.template.shape) >= 4 * TRACK_SCALE else 1
+        self.full_searches = 0
+        self.retry_in = 0
+
+    def update(self, frame):
+        """Return (x, y) of the logo in frame, the previous position if it was not found"""
+        height, width = self.template.shape
+        frame_height, frame_width = frame.shape[:2]
+        x, y = self.position
+        window = (max(0, x - TRACK_RADIUS), max(0, y - TRACK_RADIUS),
+                  min(frame_width, x + width + TRACK_RADIUS), min(frame_height, y + height + TRACK_RADIUS))
+        position, score = self.search(frame, window)
+        if score < self.threshold and self.retry_in > 0:
+            self.retry_in -= 1
+            return self.position
+        if score < self.threshold:
+            # Logo jumped (or is hidden): search the whole frame
+            self.full_searches += 1
+            position, score = self.search(frame, (0, 0, frame_width, frame_height))
+        if score < self.threshold:
+            self.retry_in = TRACK_RETRY
+            return self.position
+
+        self.position = position
+        x, y = position
+        region = gray_region(frame, (slice(y, y + height), slice(x, x + width)))
+        cv2.accumulateWeighted(region.astype(np.float32), self.template, TRACK_LEARN_RATE)
+        return position
+
+    def search(self, frame, window):
+        """Best (x, y) of the template inside window (x1, y1, x2, y2) and its score"""
+        height, width = self.template.shape
+        x1, y1, x2, y2 = window
+        if x2 - x1 < width or y2 - y1 < height:
+            return self.position, -1.0
+        gray = gray_region(frame, (slice(y1, y2), slice(x1, x2))).astype(np.float32)
+
+        # Coarse match on shrunk images, then refine within two coarse pixels
+        cx, cy = 0, 0
+        margin = max(gray.shape)
+        if self.scale > 1:
+            small = cv2.resize(gray, None, fx=1 / self.scale, fy=1 / self.scale,
+                               interpolation=cv2.INTER_AREA)
+            small_template = cv2.resize(self.template, None, fx=1 / self.scale, fy=1 / self.scale,
+                                        interpolation=cv2.INTER_AREA)
+            if small.shape[0] >= small_template.shape[0] and small.shape[1] >= small_template.shape[1]:
+                scores = cv2.matchTemplate(small, small_template, cv2.TM_CCOEFF_NORMED)
+                _, _, _, (cx, cy) = cv2.minMaxLoc(scores)
+                cx, cy = cx * self.scale, cy * self.scale
+                margin = 2 * self.scale
+
+        rx1, ry1 = max(0, cx - margin), max(0, cy - margin)
+        rx2 = min(gray.shape[1], cx + width + margin)
+        ry2 = min(gray.shape[0], cy + height + margin)
+        scores = cv2.matchTemplate(gray[ry1:ry2, rx1:rx2], self.template, cv2.TM_CCOEFF_NORMED)
+        _, best, _, (bx, by) = cv2.minMaxLoc(scores)
+        position = (x1 + rx1 + bx, y1 + ry1 + by)
+
+        # Stay put unless the new position is clearly better
+        px, py = self.position[0] - x1 - rx1, self.position[1] - y1 - ry1
+        if 0 <= py < scores.shape[0] and 0 <= px < scores.shape[1]:
+            if scores[py, px] >= best - TRACK_HYSTERESIS:
+                return self.position, float(scores[py, px])
+        return position, float(best)
+
+
+def gray_region(frame, region):
+    """Grey copy of frame[region]"""
+    crop = frame[region]
+    return cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop.copy()
+
+
+class AreaTracker:
+    """Movement of all areas of a plan, called on the reader thread in frame order
+
+    Returns a tuple of (dx, dy) per area of the plan since the template frame,
+    for RegionPlan.moved().
+    """
+
+    def __init__(self, template_frame, plan, threshold):
+        self.trackers = []
+        for area_plan in plan.areas:
+            x, y, w, h = area_plan.area
+            # Areas reaching past the frame edge are tracked by their visible part
+            x1, y1 = max(0, x), max(0, y)
+            w = min(x + w, plan.frame_shape[1]) - x1
+            h = min(y + h, plan.frame_shape[0]) - y1
+            self.trackers.append(LogoTracker(template_frame, (x1, y1, w, h), threshold))
+        self.starts = [tracker.position for tracker in self.trackers]
+
+    def __call__(self, frame):
+        return tuple((x - x0, y - y0) for (x, y), (x0, y0)
+                     in zip((tracker.update(frame) for tracker in self.trackers), self.starts))
+
+    @property
+    def full_searches(self):
+        """Number of whole-frame searches so far"""
+        return sum(tracker.full_searches for tracker in self.trackers)